@@ -0,0 +1,112 @@
+"""
+cache.py
+
+In-process LRU cache for serialized API responses.
+
+Entries are the final JSON bytes of a page, so a hit skips both pandas and the
+JSON encoder. The cache is bounded by total bytes (not entry count), entries
+expire after a TTL, and everything is dropped when the snapshot version the
+entries were computed from changes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ResultCache:
+    """
+    Thread-safe byte-budgeted LRU with TTL, keyed per snapshot version.
+    """
+
+    def __init__(self, max_bytes: int, ttl_sec: float):
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+
+        self._lock = threading.Lock()
+        # key -> (expires_at, payload); order = least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, version: str, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            if version != self._version:
+                self.misses += 1
+                return None
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, version: str, key: Hashable, payload: bytes):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if version != self._version:
+                # new snapshot: nothing computed from the old one is valid
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl_sec, payload)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = None
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self._version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Hashable):
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
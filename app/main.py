@@ -1,15 +1,142 @@
-from typing import Optional, Any, Dict, List
+import asyncio
+import base64
+import contextvars
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, AsyncIterator, Dict, Iterator, List, Tuple
 
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+import numpy as np
 import pandas as pd
 import uvicorn
 
+from app.cache import ResultCache
+from app.metrics import REGISTRY, REQUEST_SECONDS, REQUESTS_TOTAL, SLOW_PROFILES_TOTAL, STAGE_SECONDS, Gauge
+from app.profiling import SamplingProfiler, begin_request, request_work
+from app.snapshot import Snapshot, SnapshotStore
+from app.workers import DataWorkerPool
+
+logger = logging.getLogger("api")
+
 app = FastAPI()
 
-S3_CSV_URL = "https://khalid-global-food-market-data-raw.s3.us-east-2.amazonaws.com/total_data.csv"
+S3_CSV_URL = os.getenv(
+    "SOURCE_CSV_URL",
+    "https://khalid-global-food-market-data-raw.s3.us-east-2.amazonaws.com/total_data.csv",
+)
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "/tmp/food_market_snapshot")
+SNAPSHOT_CHECK_INTERVAL_SEC = float(os.getenv("SNAPSHOT_CHECK_INTERVAL_SEC", "300"))
+
+DATA_WORKERS = int(os.getenv("DATA_WORKERS", str(min(4, os.cpu_count() or 1))))
+# /export batches are encoded on their own pool so long exports cannot
+# starve /fetch_data of data workers
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESULT_CACHE_TTL_SEC = float(os.getenv("RESULT_CACHE_TTL_SEC", "600"))
+
+# responses above GZIP_MIN_BYTES are gzip-compressed for clients that accept it;
+# a mid level keeps CPU per page low (pages compress ~8x either way)
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+
+# opt-in: requests slower than this dump the sampled stacks of their time
+# window to PROFILE_DIR as folded stacks (0 = profiler off)
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/food_market_profiles")
 
-CHUNK_SIZE = 50_000
 MAX_LIMIT = 200  # keep small to avoid App Runner timeouts
+# /export writes a small first chunk so the first bytes go out right away,
+# then doubles the chunk size up to EXPORT_BATCH_ROWS
+EXPORT_FIRST_BATCH_ROWS = 50
+EXPORT_BATCH_ROWS = 1_000
+
+snapshot_store = SnapshotStore(S3_CSV_URL, SNAPSHOT_DIR, check_interval_sec=SNAPSHOT_CHECK_INTERVAL_SEC)
+# pandas work runs here, never on the event loop
+data_workers = DataWorkerPool(max_workers=DATA_WORKERS)
+export_workers = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export-worker")
+# serialized pages, keyed by snapshot version + request parameters
+result_cache = ResultCache(max_bytes=RESULT_CACHE_MAX_BYTES, ttl_sec=RESULT_CACHE_TTL_SEC)
+
+profiler = (
+    SamplingProfiler(interval_sec=PROFILE_INTERVAL_MS / 1000, output_dir=PROFILE_DIR)
+    if PROFILE_SLOW_REQUEST_MS > 0 else None
+)
+
+REGISTRY.register(Gauge("api_result_cache_bytes", "Bytes held by the result cache", lambda: result_cache.stats()["bytes"]))
+REGISTRY.register(Gauge("api_result_cache_entries", "Pages held by the result cache", lambda: result_cache.stats()["entries"]))
+REGISTRY.register(Gauge("api_data_work_inflight", "Distinct computations running on the data workers", lambda: data_workers.inflight()))
+
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES, compresslevel=GZIP_LEVEL)
+
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    started = time.monotonic()
+    request_id = begin_request() if profiler is not None else None
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.monotonic() - started
+        # the route template, not the raw path, keeps label cardinality bounded
+        route = request.scope.get("route")
+        labels = {"method": request.method, "route": getattr(route, "path", "unmatched"), "status": str(status)}
+        REQUEST_SECONDS.observe(elapsed, **labels)
+        REQUESTS_TOTAL.inc(**labels)
+
+        if profiler is not None and elapsed * 1000 >= PROFILE_SLOW_REQUEST_MS:
+            path = profiler.dump(f"{request.method} {request.url.path}", request_id, started, time.monotonic())
+            if path:
+                SLOW_PROFILES_TOTAL.inc()
+                logger.warning("Slow request %s %s took %.0f ms; stacks written to %s", request.method, request.url.path, elapsed * 1000, path)
+
+
+def get_snapshot() -> Snapshot:
+    try:
+        return snapshot_store.get()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error opening CSV: {e}")
+
+
+def serialize(content: Any) -> bytes:
+    # same encoding FastAPI's JSONResponse uses
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def to_records(page: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Converts a page to JSON-ready records; missing values become "".
+    """
+    page = page.astype(object).where(page.notna(), "")
+    return page.to_dict(orient="records")
+
+
+def encode_cursor(version: str, row: int) -> str:
+    """
+    Opaque resume token: snapshot version + position of the next row in the
+    underlying data (not in the filtered result).
+    """
+    raw = json.dumps({"v": version, "r": int(row)}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        obj = json.loads(raw)
+        return str(obj["v"]), int(obj["r"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 def fetch_data_paged(
@@ -18,71 +145,133 @@ def fetch_data_paged(
     market: Optional[str] = None,
     offset: int = 0,
     limit: int = 200,
+    cursor: Optional[str] = None,
+    snap: Optional[Snapshot] = None,
 ) -> Dict[str, Any]:
     """
-    Stream-read CSV in chunks, filter, and return a page of results.
-    offset/limit apply AFTER filtering.
+    Filter the local snapshot and return a page of results.
+    offset/limit apply AFTER filtering. If a cursor (from a previous
+    next_cursor) is given it takes precedence over offset.
     """
     # Safety
     if limit > MAX_LIMIT:
         limit = MAX_LIMIT
 
-    # We need to collect up to offset+limit rows (filtered) to serve this page.
-    target = offset + limit
-    collected = 0
-    results: List[pd.DataFrame] = []
+    if snap is None:
+        snap = get_snapshot()
 
-    try:
-        chunks = pd.read_csv(S3_CSV_URL, chunksize=CHUNK_SIZE)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error opening CSV: {e}")
+    with STAGE_SECONDS.time(stage="filter"):
+        # sorted row positions for this filter combination (built once per snapshot)
+        positions = snap.index.positions(year=year, country=country, mkt_name=market)
+        total = len(positions)
+
+        if cursor:
+            version, row = decode_cursor(cursor)
+            if version != snap.version:
+                raise HTTPException(status_code=410, detail="Cursor refers to an older data snapshot; restart from offset")
+            # binary search in the sorted positions: cost does not grow with depth
+            offset = int(np.searchsorted(positions, row, side="left"))
 
-    for chunk in chunks:
-        # normalize columns
-        chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+    # If offset is beyond available filtered rows:
+    if offset >= total:
+        return {"data": [], "next_offset": None, "next_cursor": None, "total": total}
 
-        # your dataset columns
-        country_col = "country"
-        market_col = "mkt_name"
-        year_col = "year"
+    end = offset + limit
+    with STAGE_SECONDS.time(stage="take"):
+        page = snap.frame.take(positions[offset:end])
+    more = end < total
 
-        # normalize filter columns (important)
-        # year can be read as int/float/string depending on CSV; coerce safely
-        if year_col in chunk.columns:
-            chunk[year_col] = pd.to_numeric(chunk[year_col], errors="coerce").astype("Int64")
+    with STAGE_SECONDS.time(stage="to_records"):
+        data = to_records(page)
 
-        if year is not None:
-            chunk = chunk[chunk[year_col] == year]
-        if country is not None:
-            chunk = chunk[chunk[country_col] == country]
-        if market is not None:
-            chunk = chunk[chunk[market_col] == market]
+    return {
+        "data": data,
+        "next_offset": end if more else None,
+        "next_cursor": encode_cursor(snap.version, positions[end]) if more else None,
+        "total": total,
+    }
 
-        if not chunk.empty:
-            results.append(chunk)
-            collected += len(chunk)
 
-            # stop early once we have enough to serve this page
-            if collected >= target:
-                break
+def render_fetch_data(key: Tuple, checked_version: Optional[str] = None, **params: Any) -> bytes:
+    """
+    Worker-side: returns the serialized page, computing and caching it on a miss.
+    checked_version is the snapshot version the caller already looked up in
+    the cache (so the lookup is not repeated for the same version).
+    """
+    snap = get_snapshot()
 
-    if not results:
-        return {"data": [], "next_offset": None}
+    if snap.version != checked_version:
+        payload = result_cache.get(snap.version, key)
+        if payload is not None:
+            return payload
 
-    df = pd.concat(results, ignore_index=True)
-    df = df.fillna("")
+    content = fetch_data_paged(snap=snap, **params)
+    with STAGE_SECONDS.time(stage="serialize"):
+        payload = serialize(content)
+    result_cache.put(snap.version, key, payload)
+    return payload
 
-    # If offset is beyond available filtered rows:
-    if offset >= len(df):
-        return {"data": [], "next_offset": None}
 
-    page = df.iloc[offset : offset + limit]
-    next_offset = offset + limit if (offset + limit) < len(df) else None
+def export_batches(total: int) -> Iterator[Tuple[int, int]]:
+    """
+    (start, end) ranges covering total rows: EXPORT_FIRST_BATCH_ROWS first,
+    doubling up to EXPORT_BATCH_ROWS.
+    """
+    start, size = 0, EXPORT_FIRST_BATCH_ROWS
+    while start < total:
+        end = min(total, start + size)
+        yield start, end
+        start, size = end, min(size * 2, EXPORT_BATCH_ROWS)
+
+
+def _encode_values(column: pd.Series, values: np.ndarray) -> List[str]:
+    if column.dtype.kind == "f":
+        # float repr is what json.dumps writes for finite floats
+        return [repr(v) if math.isfinite(v) else json.dumps(v) for v in values.tolist()]
+    if pd.api.types.is_integer_dtype(column.dtype):
+        return [str(int(v)) for v in values]
+    return [json.dumps(v.item() if isinstance(v, np.generic) else v, ensure_ascii=False) for v in values]
 
-    return {
-        "data": page.to_dict(orient="records"),
-        "next_offset": next_offset,
-    }
+
+def encode_ndjson(page: pd.DataFrame) -> bytes:
+    """
+    One JSON object per row, encoded column by column from the arrays;
+    missing values are left out of the object. Most price columns are empty,
+    so the work follows the number of filled cells rather than rows x columns.
+    """
+    rows: List[List[str]] = [[] for _ in range(len(page))]
+    for name in page.columns:
+        column = page[name]
+        present = np.flatnonzero(column.notna().to_numpy())
+        if not len(present):
+            continue
+        prefix = json.dumps(str(name), ensure_ascii=False) + ":"
+        encoded = _encode_values(column, column.to_numpy()[present])
+        for i, value in zip(present.tolist(), encoded):
+            rows[i].append(prefix + value)
+    return "".join("{" + ",".join(fields) + "}\n" for fields in rows).encode("utf-8")
+
+
+def encode_export_batch(frame: pd.DataFrame, positions: np.ndarray) -> bytes:
+    with request_work(), STAGE_SECONDS.time(stage="export_batch"):
+        return encode_ndjson(frame.take(positions))
+
+
+def plan_export(year: Optional[int], country: Optional[str], market: Optional[str], offset: int) -> Tuple[pd.DataFrame, np.ndarray]:
+    snap = get_snapshot()
+    return snap.frame, snap.index.positions(year=year, country=country, mkt_name=market)[offset:]
+
+
+async def iter_export_lines(frame: pd.DataFrame, positions: np.ndarray) -> AsyncIterator[bytes]:
+    """
+    Yields newline-delimited JSON for the given rows one batch at a time (see
+    export_batches), so memory stays bounded by one batch regardless of the
+    result size. Each batch is encoded on export_workers.
+    """
+    loop = asyncio.get_running_loop()
+    for start, end in export_batches(len(positions)):
+        context = contextvars.copy_context()
+        yield await loop.run_in_executor(export_workers, context.run, encode_export_batch, frame, positions[start:end])
 
 
 @app.get("/")
@@ -97,8 +286,126 @@ async def fetch_data_api(
     market: Optional[str] = Query(None),
     offset: int = Query(0, ge=0),
     limit: int = Query(MAX_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
+):
+    key = ("fetch_data", year, country, market, offset, limit, cursor)
+
+    # fast path on the event loop: cached bytes for the current snapshot
+    snap = snapshot_store.peek()
+    if snap is not None:
+        payload = result_cache.get(snap.version, key)
+        if payload is not None:
+            return Response(content=payload, media_type="application/json", headers={"X-Cache": "hit"})
+
+    payload, timing = await data_workers.run(
+        key, render_fetch_data, key, checked_version=snap.version if snap else None,
+        year=year, country=country, market=market, offset=offset, limit=limit, cursor=cursor,
+    )
+
+    logger.info(
+        "fetch_data year=%s country=%s market=%s offset=%s limit=%s queue_ms=%.1f compute_ms=%.1f coalesced=%s",
+        year, country, market, offset, limit,
+        timing.queue_wait_sec * 1000, timing.compute_sec * 1000, timing.coalesced,
+    )
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers={"Server-Timing": timing.server_timing(), "X-Cache": "miss"},
+    )
+
+
+@app.get("/export")
+async def export_api(
+    year: Optional[int] = Query(None),
+    country: Optional[str] = Query(None),
+    market: Optional[str] = Query(None),
+    offset: int = Query(0, ge=0),
 ):
-    return fetch_data_paged(year=year, country=country, market=market, offset=offset, limit=limit)
+    """
+    Streams every row matching the filter as NDJSON (one JSON object per line,
+    fields without a value omitted).
+    No MAX_LIMIT applies: rows are written incrementally as they are produced.
+    offset skips that many filtered rows (lets a client resume an export).
+    Compression is negotiated via Accept-Encoding (GZipMiddleware).
+    """
+    (frame, positions), _ = await data_workers.run(
+        ("export_plan", year, country, market, offset), plan_export, year, country, market, offset,
+    )
+
+    return StreamingResponse(
+        iter_export_lines(frame, positions),
+        media_type="application/x-ndjson",
+        headers={"X-Total-Count": str(len(positions))},
+    )
+
+
+def list_slices() -> Dict[str, Any]:
+    snap = get_snapshot()
+    counts = snap.index.counts(("year", "country"))
+    slices = [
+        {"year": int(year), "country": str(country), "rows": rows}
+        for (year, country), rows in sorted(counts.items(), key=lambda kv: (kv[0][0], str(kv[0][1])))
+    ]
+    return {"slices": slices, "total": sum(s["rows"] for s in slices)}
+
+
+@app.get("/slices")
+async def slices_api():
+    """
+    Every (year, country) combination in the data with its row count, so a
+    producer can plan a full backfill without guessing the filters.
+    """
+    payload, _ = await data_workers.run(("slices",), list_slices)
+    return payload
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus text exposition of the request, stage, cache and worker metrics.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return result_cache.stats()
+
+
+@app.get("/snapshot")
+def snapshot_info():
+    return snapshot_store.info()
+
+
+@app.post("/snapshot/refresh")
+async def snapshot_refresh(force: bool = Query(False)):
+    """
+    Explicit invalidation: re-checks the source ETag/mtime and rebuilds the
+    snapshot if it changed (or unconditionally with force=true).
+    """
+    try:
+        await data_workers.run(("snapshot_refresh", force), snapshot_store.refresh, force=force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refreshing snapshot: {e}")
+    if force:
+        # a forced rebuild keeps the same version string, so drop cached pages explicitly
+        result_cache.clear()
+    return snapshot_store.info()
+
+
+@app.on_event("startup")
+def start_profiler():
+    if profiler is not None:
+        profiler.start()
+        logger.info("Sampling profiler on: requests over %.0f ms are dumped to %s", PROFILE_SLOW_REQUEST_MS, PROFILE_DIR)
+
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    data_workers.shutdown()
+    export_workers.shutdown(wait=False)
+    if profiler is not None:
+        profiler.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+"""
+profiling.py
+
+Opt-in sampling profiler for slow requests.
+
+A background thread snapshots every thread's Python stack at a fixed
+interval (sys._current_frames) into a short ring buffer. When a request
+takes longer than the configured threshold, the samples taken while it ran
+are written out in folded-stack format ("outer;inner;leaf count" per line),
+ready for flamegraph.pl, speedscope or inferno.
+
+Only threads doing work for a request are sampled: the API middleware gives
+each request an id (begin_request) and the worker pools run its work inside
+request_work(), which records which thread serves which request. A dump
+therefore holds the slow request's own stacks, not those of concurrent
+requests or of the event loop waiting for I/O. A request that reused
+another request's in-flight result has no samples of its own.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+# id of the request being served; copied into worker threads with the context
+REQUEST_ID: ContextVar[Optional[int]] = ContextVar("request_id", default=None)
+_request_ids = count(1)
+# thread ident -> id of the request that thread is working for right now
+_thread_requests: Dict[int, int] = {}
+
+# innermost frames of a thread with nothing to do
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),  # concurrent.futures worker blocked on its work queue
+    ("base_events.py", "_run_once"),
+    ("runners.py", "run"),  # uvloop: the loop's C code runs below asyncio.run
+}
+
+
+def begin_request() -> int:
+    """
+    Allocates an id for the current request and sets it in REQUEST_ID.
+    """
+    request_id = next(_request_ids)
+    REQUEST_ID.set(request_id)
+    return request_id
+
+
+@contextmanager
+def request_work() -> Iterator[None]:
+    """
+    Attributes the calling thread's samples to REQUEST_ID while the block
+    runs (no-op outside a profiled request).
+    """
+    request_id = REQUEST_ID.get()
+    if request_id is None:
+        yield
+        return
+    ident = threading.get_ident()
+    previous = _thread_requests.get(ident)
+    _thread_requests[ident] = request_id
+    try:
+        yield
+    finally:
+        if previous is None:
+            _thread_requests.pop(ident, None)
+        else:
+            _thread_requests[ident] = previous
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval_sec: float = 0.01, window_sec: float = 120.0, output_dir: str = "/tmp/food_market_profiles"):
+        self.interval_sec = interval_sec
+        self.output_dir = output_dir
+        # (monotonic time, request id, folded stack); bounded to window_sec of samples
+        self._samples: Deque[Tuple[float, int, str]] = deque(maxlen=max(1, int(window_sec / interval_sec)))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_sec):
+            now = time.monotonic()
+            for thread_id, frame in sys._current_frames().items():
+                request_id = _thread_requests.get(thread_id)
+                if request_id is None:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self._samples.append((now, request_id, ";".join(reversed(stack))))
+
+    def folded(self, request_id: int, start: float, end: float) -> Counter:
+        """
+        Stack counts for one request's samples taken between two
+        time.monotonic() values.
+        """
+        return Counter(
+            stack for t, rid, stack in list(self._samples) if rid == request_id and start <= t <= end
+        )
+
+    def dump(self, label: str, request_id: int, start: float, end: float) -> Optional[str]:
+        """
+        Writes the request's stacks to output_dir and returns the file path
+        (None when none of its work was sampled).
+        """
+        stacks = self.folded(request_id, start, end)
+        if not stacks:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_") or "request"
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%dT%H%M%S')}_{int((end - start) * 1000)}ms_{name}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
@@ -0,0 +1,274 @@
+"""
+snapshot.py
+
+Local columnar snapshot of the source CSV.
+
+The wide CSV on S3 is converted once into a local Parquet file with typed
+`year`, `country` and `mkt_name` columns, and every API request is served from
+that snapshot instead of re-reading the CSV. The snapshot is keyed on the
+source version (ETag / Last-Modified for HTTP sources, mtime + size for local
+files) and is rebuilt when that version changes.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+
+from app.metrics import STAGE_SECONDS
+
+logger = logging.getLogger("snapshot")
+
+CHUNK_SIZE = 50_000
+
+INT_COLUMNS = ("year", "month")
+PRICE_PREFIXES = ("o_", "h_", "l_", "c_", "inflation_", "trust_")
+
+# columns the API can filter on, in index key order
+FILTER_COLUMNS = ("year", "country", "mkt_name")
+
+_EMPTY_POSITIONS = np.empty(0, dtype=np.int64)
+
+
+def source_version(source_url: str) -> str:
+    """
+    Returns a cheap version string for the source without downloading it.
+    HTTP(S) sources use ETag (or Last-Modified), local files use mtime + size.
+    """
+    if source_url.startswith(("http://", "https://")):
+        resp = requests.head(source_url, timeout=30)
+        resp.raise_for_status()
+        version = resp.headers.get("ETag") or resp.headers.get("Last-Modified")
+        if not version:
+            raise RuntimeError(f"Source {source_url} returned neither ETag nor Last-Modified")
+        return version.strip('"')
+
+    path = source_url[len("file://"):] if source_url.startswith("file://") else source_url
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def normalize_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizes column names and coerces every column to a fixed type so all
+    chunks share one schema (and so requests never have to coerce again).
+    """
+    chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+
+    for c in chunk.columns:
+        if c in INT_COLUMNS:
+            chunk[c] = pd.to_numeric(chunk[c], errors="coerce").astype("Int64")
+        elif c.startswith(PRICE_PREFIXES):
+            chunk[c] = pd.to_numeric(chunk[c], errors="coerce").astype("float64")
+        else:
+            chunk[c] = chunk[c].astype("string")
+
+    return chunk
+
+
+class RowIndex:
+    """
+    Maps each (year, country, mkt_name) filter combination to the sorted row
+    positions that match it, so a filtered page is a direct slice.
+
+    Any subset of the filter columns can be used; the mapping for each subset
+    is built once on first use and kept for the lifetime of the snapshot.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self._frame = frame
+        self._all = np.arange(len(frame), dtype=np.int64)
+        self._groups: Dict[Tuple[str, ...], Dict[tuple, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def positions(self, **filters: Any) -> np.ndarray:
+        """
+        Returns the sorted row positions matching the given filters
+        (keyword names are FILTER_COLUMNS; None means "any").
+        """
+        cols = tuple(c for c in FILTER_COLUMNS if filters.get(c) is not None)
+        if not cols:
+            return self._all
+
+        key = tuple(filters[c] for c in cols)
+        return self._group_map(cols).get(key, _EMPTY_POSITIONS)
+
+    def counts(self, cols: Tuple[str, ...]) -> Dict[tuple, int]:
+        """
+        Returns the number of rows for every key of the given filter columns.
+        """
+        return {key: len(pos) for key, pos in self._group_map(cols).items()}
+
+    def _group_map(self, cols: Tuple[str, ...]) -> Dict[tuple, np.ndarray]:
+        groups = self._groups.get(cols)
+        if groups is not None:
+            return groups
+
+        with self._lock:
+            groups = self._groups.get(cols)
+            if groups is None:
+                started = time.monotonic()
+                raw = self._frame.groupby(list(cols), sort=False).indices
+                groups = {}
+                for key, pos in raw.items():
+                    if not isinstance(key, tuple):
+                        key = (key,)
+                    # numpy scalars -> plain python so lookups with request values match
+                    key = tuple(k.item() if isinstance(k, np.generic) else k for k in key)
+                    groups[key] = np.sort(pos).astype(np.int64, copy=False)
+                self._groups[cols] = groups
+                logger.info("Built row index on %s: %s key(s) in %.2fs", cols, len(groups), time.monotonic() - started)
+        return groups
+
+
+class Snapshot:
+    """
+    One immutable, loaded snapshot of the source data.
+    """
+
+    def __init__(self, version: str, frame: pd.DataFrame):
+        self.version = version
+        self.frame = frame
+        self.index = RowIndex(frame)
+        self.loaded_at = time.time()
+
+
+class SnapshotStore:
+    """
+    Owns the on-disk snapshot and the in-memory copy served to requests.
+
+    The source version is re-checked at most every `check_interval_sec`
+    seconds; `refresh(force=True)` is the explicit invalidation path.
+    """
+
+    def __init__(self, source_url: str, snapshot_dir: str, check_interval_sec: float = 300.0):
+        self.source_url = source_url
+        self.snapshot_dir = snapshot_dir
+        self.check_interval_sec = check_interval_sec
+
+        self.data_path = os.path.join(snapshot_dir, "total_data.parquet")
+        self.meta_path = os.path.join(snapshot_dir, "total_data.meta.json")
+
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Snapshot] = None
+        self._last_check = 0.0
+
+    def get(self) -> Snapshot:
+        """
+        Returns the current snapshot, building or refreshing it if needed.
+        """
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._last_check < self.check_interval_sec:
+            return snap
+        return self.refresh()
+
+    def peek(self) -> Optional[Snapshot]:
+        """
+        Returns the current snapshot only if it needs no version check right
+        now (never blocks); None means the caller should go through get().
+        """
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._last_check < self.check_interval_sec:
+            return snap
+        return None
+
+    def refresh(self, force: bool = False) -> Snapshot:
+        """
+        Compares the source version with the snapshot and rebuilds on change.
+        force=True rebuilds even if the version is unchanged.
+        """
+        with self._lock:
+            # another thread may have refreshed while we waited for the lock
+            if (
+                not force
+                and self._snapshot is not None
+                and time.monotonic() - self._last_check < self.check_interval_sec
+            ):
+                return self._snapshot
+
+            try:
+                version = source_version(self.source_url)
+            except Exception as e:
+                if self._snapshot is not None and not force:
+                    # source temporarily unreachable: keep serving what we have
+                    logger.warning("Could not check source version (%s); keeping snapshot %s", e, self._snapshot.version)
+                    self._last_check = time.monotonic()
+                    return self._snapshot
+                raise
+
+            if not force and self._snapshot is not None and self._snapshot.version == version:
+                self._last_check = time.monotonic()
+                return self._snapshot
+
+            if force or self._read_meta().get("version") != version or not os.path.exists(self.data_path):
+                with STAGE_SECONDS.time(stage="csv_read"):
+                    self._build(version)
+
+            with STAGE_SECONDS.time(stage="snapshot_load"):
+                frame = self._load()
+            self._snapshot = Snapshot(version, frame)
+            self._last_check = time.monotonic()
+            logger.info("Serving snapshot version=%s rows=%s", version, len(self._snapshot.frame))
+            return self._snapshot
+
+    def info(self) -> Dict[str, Any]:
+        snap = self._snapshot
+        meta = self._read_meta()
+        return {
+            "source": self.source_url,
+            "version": snap.version if snap else None,
+            "rows": len(snap.frame) if snap else None,
+            "built_at": meta.get("built_at"),
+        }
+
+    def _read_meta(self) -> Dict[str, Any]:
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _build(self, version: str):
+        """
+        Converts the source CSV chunk by chunk into a Parquet file, then swaps
+        it in atomically so a half-written snapshot is never served.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        tmp_path = self.data_path + ".tmp"
+
+        started = time.monotonic()
+        writer = None
+        rows = 0
+        try:
+            for chunk in pd.read_csv(self.source_url, chunksize=CHUNK_SIZE, dtype=str, keep_default_na=True):
+                chunk = normalize_chunk(chunk)
+                if writer is None:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                else:
+                    table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            raise RuntimeError(f"Source {self.source_url} contained no rows")
+
+        os.replace(tmp_path, self.data_path)
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "source": self.source_url, "rows": rows, "built_at": time.time()}, f)
+
+        logger.info("Built snapshot version=%s rows=%s in %.1fs", version, rows, time.monotonic() - started)
+
+    def _load(self) -> pd.DataFrame:
+        return pd.read_parquet(self.data_path, memory_map=True)
@@ -0,0 +1,90 @@
+"""
+workers.py
+
+Bounded worker pool for the blocking pandas work behind the API.
+
+Route handlers hand their data work to this pool instead of running it on the
+uvicorn event loop, so the loop (and cheap endpoints such as the `/` health
+check) stays responsive. Identical requests that are already in flight are
+coalesced: N concurrent callers for the same key share one computation.
+"""
+
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from app.profiling import request_work
+
+
+class WorkTiming:
+    """
+    Where a request spent its time: waiting for a free worker vs computing.
+    coalesced=True means the caller reused another request's computation.
+    """
+
+    def __init__(self, queue_wait_sec: float, compute_sec: float, coalesced: bool = False):
+        self.queue_wait_sec = queue_wait_sec
+        self.compute_sec = compute_sec
+        self.coalesced = coalesced
+
+    def server_timing(self) -> str:
+        """
+        Value for the Server-Timing response header (durations in ms).
+        """
+        value = f"queue;dur={self.queue_wait_sec * 1000:.1f}, compute;dur={self.compute_sec * 1000:.1f}"
+        if self.coalesced:
+            value += ', coalesced;desc="shared in-flight result"'
+        return value
+
+
+class DataWorkerPool:
+    """
+    Thread pool with in-flight request coalescing.
+
+    Threads (not processes) are used on purpose: workers share the in-memory
+    snapshot and row index, and the numpy/pandas gathers release the GIL for
+    most of their work.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="data-worker")
+        self._inflight: Dict[Hashable, "asyncio.Future[Tuple[Any, WorkTiming]]"] = {}
+
+    async def run(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, WorkTiming]:
+        """
+        Runs fn(*args, **kwargs) on the pool and returns (result, timing).
+        If a call with the same key is already running, waits for it instead.
+        """
+        fut = self._inflight.get(key)
+        if fut is not None:
+            waited = time.perf_counter()
+            result, timing = await asyncio.shield(fut)
+            return result, WorkTiming(time.perf_counter() - waited, 0.0, coalesced=True)
+
+        submitted = time.perf_counter()
+
+        def call() -> Tuple[Any, WorkTiming]:
+            started = time.perf_counter()
+            with request_work():
+                result = fn(*args, **kwargs)
+            return result, WorkTiming(started - submitted, time.perf_counter() - started)
+
+        # run in the caller's context so request_work() sees its request id
+        context = contextvars.copy_context()
+        fut = asyncio.get_running_loop().run_in_executor(self._executor, context.run, call)
+        self._inflight[key] = fut
+        try:
+            # shield: a disconnecting client must not cancel work others are waiting on
+            return await asyncio.shield(fut)
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,128 @@
+"""
+bench_fetch_page.py
+
+Per-page round trip of the producer's API call, with and without connection
+reuse and response compression, against a local uvicorn instance (or any
+--api-url, e.g. the App Runner service, where TLS setup makes reuse matter
+even more).
+
+Variants:
+  new-connection identity   requests.get per page, no compression (old fetch_page)
+  new-connection gzip       requests.get per page, gzip
+  pooled identity           shared Session, no compression
+  pooled gzip               shared Session, gzip (current fetch_page)
+  async pooled gzip         httpx AsyncPageFetcher, concurrent (if httpx is installed)
+
+The response cache is disabled on the local server so every request does
+the same server-side work.
+
+Usage:
+  python -m benchmarks.bench_fetch_page --pages 200 --limit 200
+"""
+
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import requests
+
+from benchmarks.local_api import LocalApi
+from src.producers.http_client import AsyncPageFetcher, build_session, httpx
+from src.producers.stream_to_kinesis import page_params, validate_page
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(name: str, latencies: List[float], wire_bytes: List[int], elapsed: float) -> Dict[str, Any]:
+    return {
+        "variant": name,
+        "pages": len(latencies),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "wire_kb_per_page": round(statistics.mean(wire_bytes) / 1024, 1) if wire_bytes else None,
+        "pages_per_sec": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def run_sync(name: str, api_url: str, offsets: List[int], limit: int, pooled: bool, encoding: str) -> Dict[str, Any]:
+    session = build_session() if pooled else None
+    headers = {"Accept-Encoding": encoding}
+    latencies, wire = [], []
+
+    started = time.perf_counter()
+    for offset in offsets:
+        t0 = time.perf_counter()
+        get = session.get if session is not None else requests.get
+        resp = get(api_url, params=page_params(None, None, offset, limit), headers=headers, timeout=60)
+        resp.raise_for_status()
+        validate_page(resp.json())
+        latencies.append(time.perf_counter() - t0)
+        # Content-Length is the size on the wire (compressed when gzip was negotiated)
+        wire.append(int(resp.headers.get("Content-Length", len(resp.content))))
+    elapsed = time.perf_counter() - started
+
+    if session is not None:
+        session.close()
+    return summarize(name, latencies, wire, elapsed)
+
+
+def run_async(api_url: str, offsets: List[int], limit: int, concurrency: int) -> Dict[str, Any]:
+    fetcher = AsyncPageFetcher(max_connections=concurrency)
+    latencies: List[float] = []
+
+    def one(offset: int):
+        t0 = time.perf_counter()
+        validate_page(fetcher.submit(api_url, page_params(None, None, offset, limit)).result())
+        latencies.append(time.perf_counter() - t0)
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, offsets))
+        elapsed = time.perf_counter() - started
+    finally:
+        fetcher.close()
+    return summarize(f"async pooled gzip x{concurrency}", latencies, [], elapsed)
+
+
+def run(api_url: str, pages: int, limit: int, concurrency: int) -> List[Dict[str, Any]]:
+    offsets = [i * limit for i in range(pages)]
+    results = [
+        run_sync("new-connection identity", api_url, offsets, limit, pooled=False, encoding="identity"),
+        run_sync("new-connection gzip", api_url, offsets, limit, pooled=False, encoding="gzip"),
+        run_sync("pooled identity", api_url, offsets, limit, pooled=True, encoding="identity"),
+        run_sync("pooled gzip", api_url, offsets, limit, pooled=True, encoding="gzip"),
+    ]
+    if httpx is not None:
+        results.append(run_async(api_url, offsets, limit, concurrency))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fetch_page round trips")
+    parser.add_argument("--api-url", default=None, help="Benchmark this /fetch_data URL instead of a local server")
+    parser.add_argument("--rows", type=int, default=50000, help="Synthetic rows for the local server")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="In-flight requests for the async variant")
+    args = parser.parse_args()
+
+    if args.api_url:
+        results = run(args.api_url, args.pages, args.limit, args.concurrency)
+    else:
+        with LocalApi(rows=args.rows, RESULT_CACHE_MAX_BYTES="0") as api:
+            results = run(api.base_url + "/fetch_data", args.pages, args.limit, args.concurrency)
+
+    for r in results:
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
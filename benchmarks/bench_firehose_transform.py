@@ -0,0 +1,106 @@
+"""
+bench_firehose_transform.py
+
+Replays a synthetic Firehose transformation event (about 3 MB of base64
+records, the same JSON rows the producer sends) through the Lambda handler
+and reports records/sec for the original encoder and the fast path, with and
+without orjson. Every variant's output is checked to be byte-identical to
+the original encoder's.
+
+Usage:
+  python -m benchmarks.bench_firehose_transform --event-mb 3 --rows-per-record 1
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+
+from benchmarks.synthetic_data import load_lambda_module, synthetic_rows
+
+
+def build_event(event_mb: float, rows_per_record: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    Records are added until the base64 payload reaches event_mb. Aggregated
+    records hold rows_per_record newline-delimited rows (producer --aggregate).
+    """
+    target = int(event_mb * 1024 * 1024)
+    records: List[Dict[str, Any]] = []
+    size = 0
+    rows = synthetic_rows(10 ** 9, seed)
+    while size < target:
+        lines = [json.dumps(next(rows), ensure_ascii=False) for _ in range(rows_per_record)]
+        data = base64.b64encode("\n".join(lines).encode("utf-8")).decode("ascii")
+        records.append({"recordId": str(len(records)), "approximateArrivalTimestamp": 0, "data": data})
+        size += len(data)
+    return {"invocationId": "bench", "records": records}
+
+
+def run_handler(module, event: Dict[str, Any]) -> Dict[str, Any]:
+    with contextlib.redirect_stdout(io.StringIO()):  # the handler prints a summary line
+        return module.lambda_handler(event, None)
+
+
+def time_variant(module, event: Dict[str, Any], repeats: int) -> List[float]:
+    run_handler(module, event)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        run_handler(module, event)
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Firehose transform Lambda")
+    parser.add_argument("--event-mb", type=float, default=3.0)
+    parser.add_argument("--rows-per-record", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    module = load_lambda_module()
+    event = build_event(args.event_mb, args.rows_per_record)
+    n_records = len(event["records"])
+    n_rows = n_records * args.rows_per_record
+
+    orjson = module.orjson
+    variants = [("legacy", False, None), ("fast (json)", True, None)]
+    if orjson is not None:
+        variants.append(("fast (orjson)", True, orjson))
+
+    reference = None
+    results = []
+    for name, fast, json_lib in variants:
+        module.FAST_TRANSFORM = fast
+        module.orjson = json_lib
+        out = run_handler(module, event)
+        if any(r["result"] != "Ok" for r in out["records"]):
+            raise RuntimeError(f"{name}: some records failed to transform")
+        if reference is None:
+            reference = out
+        elif out != reference:
+            raise RuntimeError(f"{name}: output differs from the legacy encoder")
+
+        timings = time_variant(module, event, args.repeats)
+        best = min(timings)
+        results.append({
+            "variant": name,
+            "records": n_records,
+            "rows": n_rows,
+            "median_ms": round(statistics.median(timings) * 1000, 1),
+            "records_per_sec": round(n_records / best),
+            "rows_per_sec": round(n_rows / best),
+        })
+
+    base = results[0]["records_per_sec"]
+    for r in results:
+        r["speedup"] = round(r["records_per_sec"] / base, 2)
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+bench_output_formats.py
+
+Compares the Firehose transform's output formats (csv, json_sparse, long) on
+a synthetic sample: transform time, bytes delivered to S3 (raw and gzip, as
+Firehose can compress), and the time to parse the delivered file.
+
+Parsing uses pyarrow's multithreaded C++ CSV/JSON readers as a local
+stand-in for Snowpipe's COPY parse cost; absolute numbers differ from
+Snowflake, the ratios between formats are what matter.
+
+Usage:
+  python -m benchmarks.bench_output_formats --rows 20000
+"""
+
+import argparse
+import base64
+import contextlib
+import gzip
+import io
+import json
+import time
+from typing import Any, Dict, List
+
+from benchmarks.synthetic_data import load_lambda_module, synthetic_rows
+
+try:
+    import pyarrow.csv as pa_csv
+    import pyarrow.json as pa_json
+except ImportError:
+    pa_csv = pa_json = None
+
+
+def build_events(rows: int, records_per_event: int) -> List[Dict[str, Any]]:
+    events, records = [], []
+    for row in synthetic_rows(rows):
+        data = base64.b64encode(json.dumps(row, ensure_ascii=False).encode("utf-8")).decode("ascii")
+        records.append({"recordId": str(len(records)), "data": data})
+        if len(records) == records_per_event:
+            events.append({"records": records})
+            records = []
+    if records:
+        events.append({"records": records})
+    return events
+
+
+def transform(module, events: List[Dict[str, Any]]) -> bytes:
+    """
+    Runs every event through the handler and returns the bytes Firehose would
+    write to S3 (the concatenated record outputs).
+    """
+    parts = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for event in events:
+            for r in module.lambda_handler(event, None)["records"]:
+                if r["result"] == "Ok":
+                    parts.append(base64.b64decode(r["data"]))
+                elif r["result"] != "Dropped":
+                    raise RuntimeError(f"record {r['recordId']} failed")
+    return b"".join(parts)
+
+
+def parse(fmt: str, data: bytes, field_order: List[str]) -> Dict[str, Any]:
+    if pa_csv is None:
+        return {}
+    t0 = time.perf_counter()
+    if fmt == "json_sparse":
+        table = pa_json.read_json(io.BytesIO(data))
+    else:
+        names = field_order if fmt == "csv" else ["country", "mkt_name", "dates", "item", "type", "value"]
+        table = pa_csv.read_csv(io.BytesIO(data), read_options=pa_csv.ReadOptions(column_names=names))
+    return {"parse_ms": round((time.perf_counter() - t0) * 1000, 1), "parsed_rows": table.num_rows, "parsed_columns": table.num_columns}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Firehose transform output formats")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--records-per-event", type=int, default=500)
+    args = parser.parse_args()
+
+    module = load_lambda_module()
+    events = build_events(args.rows, args.records_per_event)
+
+    results = []
+    for fmt in module.OUTPUT_FORMATS:
+        module.OUTPUT_FORMAT = fmt
+        t0 = time.perf_counter()
+        data = transform(module, events)
+        transform_ms = (time.perf_counter() - t0) * 1000
+
+        results.append({
+            "format": fmt,
+            "rows_in": args.rows,
+            "transform_ms": round(transform_ms, 1),
+            "bytes": len(data),
+            "gzip_bytes": len(gzip.compress(data, compresslevel=6)),
+            **parse(fmt, data, list(module.FIELD_ORDER)),
+        })
+
+    base = results[0]
+    for r in results:
+        r["size_vs_csv"] = round(r["bytes"] / base["bytes"], 3)
+        if "parse_ms" in r:
+            r["parse_vs_csv"] = round(r["parse_ms"] / base["parse_ms"], 3)
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+bench_pipeline.py
+
+End-to-end throughput of the pipeline without AWS:
+
+  api        fetch_page over every page of a synthetic total_data.csv served
+             by app.main:app in-process (LocalApi)
+  produce    stream_all_pages (or the pipelined variant) into FakeKinesis,
+             which throttles each shard at its records/s and bytes/s limits
+  transform  the records Kinesis accepted, batched into Firehose-sized
+             events and run through the Lambda handler
+
+Each stage reports rows/sec, p50/p99 latency of its unit of work (API page,
+PutRecords call, Lambda invocation) and the process's peak RSS so far (the
+in-process API server included). Results can be written as JSON with --out
+and compared against an earlier run with --baseline.
+
+The API limiter is left off: its starting rate is meant for App Runner and
+would pace the local server instead of measuring it.
+
+Usage:
+  python -m benchmarks.bench_pipeline --rows 5000 --shards 4 --out results.json
+  python -m benchmarks.bench_pipeline --rows 5000 --shards 4 --baseline results.json
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import logging
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.bench_fetch_page import percentile
+from benchmarks.fake_kinesis import FakeKinesis
+from benchmarks.local_api import LocalApi
+from benchmarks.synthetic_data import REPO_ROOT, load_lambda_module
+from src.producers.partitioning import FieldPartitioner
+from src.producers.rate_limit import StreamRateLimiter
+from src.producers.stream_to_kinesis import METRICS, fetch_page, stream_all_pages, stream_all_pages_pipelined
+
+STREAM_NAME = "bench_stream"
+FIREHOSE_MAX_RECORDS = 500  # records per transform invocation in this benchmark
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stage_result(stage: str, rows: int, elapsed: float, latencies: List[float], unit: str, **extra: Any) -> Dict[str, Any]:
+    return {
+        "stage": stage,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "unit": unit,
+        "calls": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+
+def run_api(api_url: str, limit: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    rows = 0
+    offset: Optional[int] = 0
+    started = time.perf_counter()
+    while offset is not None:
+        t0 = time.perf_counter()
+        payload = fetch_page(api_url, year=None, country=None, offset=offset, limit=limit)
+        latencies.append(time.perf_counter() - t0)
+        rows += len(payload["data"])
+        offset = payload.get("next_offset") if payload["data"] else None
+    return stage_result("api", rows, time.perf_counter() - started, latencies, "page")
+
+
+class TimedKinesis:
+    """
+    Records the wall time of every put_records call made through it.
+    """
+
+    def __init__(self, client: FakeKinesis):
+        self.client = client
+        self.latencies: List[float] = []
+
+    def put_records(self, **kwargs) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            return self.client.put_records(**kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - t0)
+
+    def list_shards(self, **kwargs) -> Dict[str, Any]:
+        return self.client.list_shards(**kwargs)
+
+
+def run_produce(api_url: str, kinesis: FakeKinesis, args) -> Dict[str, Any]:
+    client = TimedKinesis(kinesis)
+    send_options: Dict[str, Any] = {
+        "partitioner": FieldPartitioner("mkt_name"),
+        "aggregate": args.aggregate,
+    }
+    if args.rate_control == "adaptive":
+        send_options["rate_limiter"] = StreamRateLimiter.adaptive(len(kinesis.shards))
+    elif args.rate_control == "fixed":
+        send_options["rate_limiter"] = StreamRateLimiter.for_shards(len(kinesis.shards))
+
+    common = dict(
+        api_url=api_url, kinesis_client=client, stream_name=STREAM_NAME,
+        year=None, country=None, start_offset=0, limit=args.limit, send_options=send_options,
+    )
+    before = METRICS.snapshot()
+    started = time.perf_counter()
+    if args.pipeline:
+        rows = stream_all_pages_pipelined(**common)
+    else:
+        rows = stream_all_pages(**common)
+    elapsed = time.perf_counter() - started
+    after = METRICS.snapshot()
+
+    return stage_result(
+        "produce", rows, elapsed, client.latencies, "PutRecords call",
+        records_sent=after["records_sent"] - before["records_sent"],
+        records_retried=after["records_retried"] - before["records_retried"],
+        throttled=kinesis.throttled,
+        final_failures=after["final_failures"] - before["final_failures"],
+    )
+
+
+def firehose_events(records: List[bytes], event_mb: float):
+    """
+    Groups records into transform invocations the way Firehose buffers
+    them: up to event_mb of base64 payload or FIREHOSE_MAX_RECORDS records.
+    """
+    limit = int(event_mb * 1024 * 1024)
+    batch: List[Dict[str, Any]] = []
+    size = 0
+    for data in records:
+        encoded = base64.b64encode(data).decode("ascii")
+        if batch and (size + len(encoded) > limit or len(batch) >= FIREHOSE_MAX_RECORDS):
+            yield {"invocationId": "bench", "records": batch}
+            batch, size = [], 0
+        batch.append({"recordId": str(len(batch)), "approximateArrivalTimestamp": 0, "data": encoded})
+        size += len(encoded)
+    if batch:
+        yield {"invocationId": "bench", "records": batch}
+
+
+def run_transform(records: List[bytes], event_mb: float) -> Dict[str, Any]:
+    module = load_lambda_module()
+    events = list(firehose_events(records, event_mb))
+    rows = sum(data.count(b"\n") + 1 for data in records)
+
+    latencies: List[float] = []
+    failed = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # the handler prints a summary line
+        for event in events:
+            t0 = time.perf_counter()
+            out = module.lambda_handler(event, None)
+            latencies.append(time.perf_counter() - t0)
+            failed += sum(1 for r in out["records"] if r["result"] == "ProcessingFailed")
+    return stage_result(
+        "transform", rows, time.perf_counter() - started, latencies, "invocation",
+        output_format=module.OUTPUT_FORMAT, failed_records=failed,
+    )
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> List[Dict[str, Any]]:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {s["stage"]: s for s in json.load(f)["stages"]}
+    rows = []
+    for r in results:
+        base = baseline.get(r["stage"])
+        if not base or not base.get("rows_per_sec") or not r.get("rows_per_sec"):
+            continue
+        rows.append({
+            "stage": r["stage"],
+            "rows_per_sec": r["rows_per_sec"],
+            "baseline_rows_per_sec": base["rows_per_sec"],
+            "ratio": round(r["rows_per_sec"] / base["rows_per_sec"], 3),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against local fakes")
+    parser.add_argument("--rows", type=int, default=5000, help="Synthetic rows served by the local API")
+    parser.add_argument("--limit", type=int, default=200, help="API page size")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--shard-records-per-sec", type=float, default=1000.0)
+    parser.add_argument("--shard-bytes-per-sec", type=float, default=1024 * 1024)
+    parser.add_argument("--put-latency-ms", type=float, default=0.0, help="Fixed delay per PutRecords call")
+    parser.add_argument("--rate-control", choices=["adaptive", "fixed", "off"], default="adaptive")
+    parser.add_argument("--aggregate", action="store_true")
+    parser.add_argument("--pipeline", action="store_true", help="Use stream_all_pages_pipelined")
+    parser.add_argument("--event-mb", type=float, default=3.0, help="Firehose transform invocation payload size")
+    parser.add_argument("--out", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Compare rows/sec against a previous --out file")
+    args = parser.parse_args()
+
+    # retry warnings under throttling are expected and would flood the output
+    logging.getLogger("api_to_kds").setLevel(logging.ERROR)
+
+    kinesis = FakeKinesis(
+        shard_count=args.shards,
+        records_per_sec=args.shard_records_per_sec,
+        bytes_per_sec=args.shard_bytes_per_sec,
+        call_latency_sec=args.put_latency_ms / 1000,
+    )
+
+    stages: List[Callable[[str], Dict[str, Any]]] = [
+        lambda url: run_api(url, args.limit),
+        lambda url: run_produce(url, kinesis, args),
+    ]
+    results = []
+    with LocalApi(rows=args.rows) as api:
+        for stage in stages:
+            results.append(stage(api.base_url + "/fetch_data"))
+            print(json.dumps(results[-1]), flush=True)
+    results.append(run_transform(kinesis.records, args.event_mb))
+    print(json.dumps(results[-1]), flush=True)
+
+    if args.baseline:
+        for row in compare(results, args.baseline):
+            print(json.dumps(row))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "created_at": time.time(), "params": vars(args), "stages": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+fake_kinesis.py
+
+In-memory stand-in for the boto3 Kinesis client (put_records, list_shards)
+so the producer can be benchmarked without AWS. Partition keys are routed to
+shards by MD5 hash range as in Kinesis, and each shard enforces its write
+limits: entries over a shard's records/s or bytes/s budget fail with
+ProvisionedThroughputExceededException in the per-record results, exactly
+like a partially failed PutRecords call.
+"""
+
+import bisect
+import hashlib
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.producers.rate_limit import SHARD_BYTES_PER_SEC, SHARD_RECORDS_PER_SEC
+
+HASH_KEY_SPACE = 2 ** 128
+
+
+class _Shard:
+    def __init__(self, shard_id: str, start: int, end: int, records_per_sec: float, bytes_per_sec: float):
+        self.shard_id = shard_id
+        self.start = start
+        self.end = end
+        self.records_per_sec = records_per_sec
+        self.bytes_per_sec = bytes_per_sec
+        # one second of burst, like the per-second shard limits
+        self.records = records_per_sec
+        self.bytes = bytes_per_sec
+        self.updated = time.monotonic()
+        self.sequence = 0
+
+    def refill(self, now: float):
+        elapsed = now - self.updated
+        self.records = min(self.records_per_sec, self.records + elapsed * self.records_per_sec)
+        self.bytes = min(self.bytes_per_sec, self.bytes + elapsed * self.bytes_per_sec)
+        self.updated = now
+
+    def try_put(self, size: int) -> bool:
+        if self.records < 1 or self.bytes < size:
+            return False
+        self.records -= 1
+        self.bytes -= size
+        self.sequence += 1
+        return True
+
+
+class FakeKinesis:
+    """
+    Accepted records are kept in arrival order in .records (Data bytes), for
+    replaying through the Firehose transform. call_latency_sec adds a fixed
+    delay per PutRecords call to stand in for the network round trip.
+    """
+
+    def __init__(
+        self,
+        shard_count: int = 2,
+        records_per_sec: float = SHARD_RECORDS_PER_SEC,
+        bytes_per_sec: float = SHARD_BYTES_PER_SEC,
+        call_latency_sec: float = 0.0,
+    ):
+        width = HASH_KEY_SPACE // shard_count
+        self.shards = [
+            _Shard(
+                f"shardId-{i:012d}",
+                i * width,
+                HASH_KEY_SPACE - 1 if i == shard_count - 1 else (i + 1) * width - 1,
+                records_per_sec,
+                bytes_per_sec,
+            )
+            for i in range(shard_count)
+        ]
+        self._starts = [s.start for s in self.shards]
+        self.call_latency_sec = call_latency_sec
+        self.records: List[bytes] = []
+        self.put_calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _shard_for(self, record: Dict[str, Any]) -> _Shard:
+        if record.get("ExplicitHashKey") is not None:
+            hash_key = int(record["ExplicitHashKey"])
+        else:
+            hash_key = int(hashlib.md5(record["PartitionKey"].encode("utf-8")).hexdigest(), 16)
+        return self.shards[bisect.bisect_right(self._starts, hash_key) - 1]
+
+    def put_records(self, StreamName: str, Records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if self.call_latency_sec > 0:
+            time.sleep(self.call_latency_sec)
+
+        results = []
+        failed = 0
+        with self._lock:
+            self.put_calls += 1
+            now = time.monotonic()
+            for shard in self.shards:
+                shard.refill(now)
+            for record in Records:
+                shard = self._shard_for(record)
+                if shard.try_put(len(record["Data"]) + len(record["PartitionKey"].encode("utf-8"))):
+                    self.records.append(record["Data"])
+                    results.append({"SequenceNumber": str(shard.sequence), "ShardId": shard.shard_id})
+                else:
+                    failed += 1
+                    results.append({
+                        "ErrorCode": "ProvisionedThroughputExceededException",
+                        "ErrorMessage": f"Rate exceeded for shard {shard.shard_id}",
+                    })
+            self.throttled += failed
+        return {"FailedRecordCount": failed, "Records": results}
+
+    def list_shards(self, StreamName: Optional[str] = None, NextToken: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "Shards": [
+                {
+                    "ShardId": s.shard_id,
+                    "HashKeyRange": {"StartingHashKey": str(s.start), "EndingHashKey": str(s.end)},
+                    "SequenceNumberRange": {"StartingSequenceNumber": "0"},
+                }
+                for s in self.shards
+            ]
+        }
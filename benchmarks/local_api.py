@@ -0,0 +1,66 @@
+"""
+local_api.py
+
+Runs the FastAPI app in-process on a background uvicorn thread, serving a
+synthetic CSV, for benchmarks.
+"""
+
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from benchmarks.synthetic_data import write_synthetic_csv
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalApi:
+    """
+    Context manager: generates the data, starts uvicorn and builds the
+    snapshot before yielding, so the first timed request isn't a cold start.
+    """
+
+    def __init__(self, rows: int = 20000, workdir: Optional[str] = None, port: Optional[int] = None, **env: str):
+        self.rows = rows
+        self.workdir = workdir or tempfile.mkdtemp(prefix="food_market_bench_")
+        self.port = port or free_port()
+        self.env = env
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "LocalApi":
+        csv_path = os.path.join(self.workdir, "total_data.csv")
+        if not os.path.exists(csv_path):
+            write_synthetic_csv(csv_path, self.rows)
+
+        # app.main reads its settings at import time
+        os.environ["SOURCE_CSV_URL"] = csv_path
+        os.environ["SNAPSHOT_DIR"] = os.path.join(self.workdir, "snapshot")
+        os.environ.update(self.env)
+
+        import uvicorn
+        from app.main import app, snapshot_store
+
+        snapshot_store.get()
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="bench-uvicorn", daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
@@ -0,0 +1,84 @@
+"""
+synthetic_data.py
+
+Writes a CSV with the same columns as the source total_data.csv (taken from
+the Firehose transform's FIELD_ORDER), so the API and producer can be
+benchmarked locally without S3 access.
+
+Usage:
+  python -m benchmarks.synthetic_data --rows 20000 --out /tmp/total_data.csv
+"""
+
+import argparse
+import csv
+import importlib.util
+import os
+import random
+from typing import Any, Dict, Iterator
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_PATH = os.path.join(REPO_ROOT, "lambda", "firehose_transform", "lambda_function.py")
+
+COUNTRIES = ["Sri Lanka", "Armenia", "Nigeria", "Yemen", "Haiti"]
+YEARS = list(range(2008, 2014))
+MARKETS_PER_COUNTRY = 8
+PRICE_FILL_RATE = 0.05  # the real data is sparse: most item columns are empty
+
+
+def load_lambda_module():
+    # "lambda" is a keyword, so the handler can't be imported as a package
+    spec = importlib.util.spec_from_file_location("firehose_lambda_function", LAMBDA_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def field_order():
+    return list(load_lambda_module().FIELD_ORDER)
+
+
+def synthetic_rows(rows: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Rows shaped like the API's JSON: every column present, missing prices as "".
+    """
+    rnd = random.Random(seed)
+    fields = field_order()
+
+    for _ in range(rows):
+        country = rnd.choice(COUNTRIES)
+        year = rnd.choice(YEARS)
+        month = rnd.randint(1, 12)
+        row: Dict[str, Any] = {
+            "country": country,
+            "mkt_name": f"{country} market {rnd.randrange(MARKETS_PER_COUNTRY)}",
+            "dates": f"{year}-{month:02d}-01",
+            "year": year,
+            "month": month,
+        }
+        for col in fields[5:]:
+            row[col] = round(rnd.uniform(0.1, 500.0), 2) if rnd.random() < PRICE_FILL_RATE else ""
+        yield row
+
+
+def write_synthetic_csv(path: str, rows: int, seed: int = 0) -> str:
+    fields = field_order()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(fields)
+        for row in synthetic_rows(rows, seed):
+            w.writerow([row[col] for col in fields])
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic total_data.csv")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    write_synthetic_csv(args.out, args.rows, args.seed)
+    print(args.out)
+
+
+if __name__ == "__main__":
+    main()
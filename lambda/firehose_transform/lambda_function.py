@@ -2,6 +2,14 @@ import base64
 import json
 import csv
 import io
+import os
+import time
+from operator import itemgetter
+
+try:
+    import orjson  # optional: ~3-5x faster JSON parsing, same Python values
+except ImportError:
+    orjson = None
 
 FIELD_ORDER = [
     "country", "mkt_name", "dates", "year", "month",
@@ -85,13 +93,213 @@ FIELD_ORDER = [
     "o_food_price_index", "h_food_price_index", "l_food_price_index", "c_food_price_index", "inflation_food_price_index", "trust_food_price_index"
 ]
 
+# csv:         one wide line per row, FIELD_ORDER columns (RAW.RAW_DATA)
+# json_sparse: one JSON object per row, empty fields dropped (RAW.RAW_DATA_SPARSE)
+# long:        one (country, mkt_name, dates, item, type, value) CSV line per
+#              non-empty price field (RAW.RAW_DATA_LONG)
+OUTPUT_FORMATS = ("csv", "json_sparse", "long")
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "csv")
+if OUTPUT_FORMAT not in OUTPUT_FORMATS:
+    raise ValueError(f"OUTPUT_FORMAT must be one of {OUTPUT_FORMATS}, got {OUTPUT_FORMAT!r}")
+
+# FAST_TRANSFORM=0 switches back to the original per-record encoder (csv only)
+FAST_TRANSFORM = os.getenv("FAST_TRANSFORM", "1") != "0"
+
+# EMF_METRICS=1 prints one CloudWatch Embedded Metric Format line per
+# invocation (record counts, bytes, invocation and per-record transform time)
+EMF_METRICS = os.getenv("EMF_METRICS", "0") == "1"
+EMF_NAMESPACE = os.getenv("EMF_NAMESPACE", "FoodMarket/FirehoseTransform")
+
+# one C-level call pulls every column, in order; raises KeyError if a column is missing
+_extract_row = itemgetter(*FIELD_ORDER)
+
+_FIELDS = frozenset(FIELD_ORDER)
+_ID_FIELDS = ("country", "mkt_name", "dates")
+
+# price column -> (item, type), named like the CLEAN tables:
+# "inflation_cassava_flour" -> ("CASSAVA_FLOUR", "INFLATION")
+_TYPE_NAMES = {"o": "OPEN", "h": "HIGH", "l": "LOW", "c": "CLOSE", "inflation": "INFLATION", "trust": "TRUST"}
+_PRICE_COLUMNS = [
+    (col, col.split("_", 1)[1].upper(), _TYPE_NAMES[col.split("_", 1)[0]])
+    for col in FIELD_ORDER
+    if col.split("_", 1)[0] in _TYPE_NAMES
+]
+
+
+def _orjson_loads(line):
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return json.loads(line)  # e.g. NaN/Infinity, which json accepts
+
+
+def encode_csv_legacy(payload_str):
+    """
+    Original encoder: a new StringIO/csv.writer per record and a dict lookup per column.
+    """
+    lines = [line for line in payload_str.split("\n") if line.strip()]
+    if not lines:
+        raise ValueError("Empty record")
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for line in lines:
+        obj = json.loads(line)
+
+        # dict -> ordered row (missing keys become "")
+        row = [obj.get(col, "") for col in FIELD_ORDER]
+
+        # row -> CSV line (proper quoting)
+        writer.writerow(row)
+    return buf.getvalue()  # includes newline(s)
+
+
+def _payload_lines(payload_str):
+    # same test as line.strip(), without copying every line
+    lines = [line for line in payload_str.split("\n") if line and not line.isspace()]
+    if not lines:
+        raise ValueError("Empty record")
+    return lines
+
+
+def _default_loads():
+    return _orjson_loads if orjson is not None else json.loads
+
+
+def _is_empty(value):
+    return value == "" or value is None or value != value  # NaN
+
+
+def encode_csv_fast(payload_str, buf, writer, loads=None):
+    """
+    Same output as encode_csv_legacy, byte for byte, but reuses the caller's
+    buffer/writer, parses with orjson when available and extracts columns
+    with itemgetter (per-column .get() only for rows with missing keys).
+    """
+    if loads is None:
+        loads = _default_loads()
+
+    rows = []
+    for line in _payload_lines(payload_str):
+        obj = loads(line)
+        try:
+            rows.append(_extract_row(obj))
+        except KeyError:
+            rows.append([obj.get(col, "") for col in FIELD_ORDER])
+
+    buf.seek(0)
+    buf.truncate()
+    writer.writerows(rows)
+    text = buf.getvalue()
+
+    if loads is not json.loads and "e+" in text:
+        # orjson turns integers wider than 64 bits into floats where json keeps
+        # them exact; those floats always print with an exponent, so redo the
+        # (rare) records that contain one with json
+        return encode_csv_fast(payload_str, buf, writer, json.loads)
+    return text
+
+
+def encode_json_sparse(payload_str):
+    """
+    One compact JSON object per row with only the FIELD_ORDER fields that hold
+    a value (most of the ~450 price fields are empty).
+    """
+    loads = _default_loads()
+    out = []
+    for line in _payload_lines(payload_str):
+        obj = loads(line)
+        sparse = {k: v for k, v in obj.items() if k in _FIELDS and not _is_empty(v)}
+        if orjson is not None:
+            try:
+                out.append(orjson.dumps(sparse).decode("utf-8"))
+                continue
+            except TypeError:
+                pass  # e.g. integers wider than 64 bits
+        out.append(json.dumps(sparse, ensure_ascii=False, separators=(",", ":")))
+    return "\n".join(out) + "\n"
+
+
+def encode_long(payload_str, buf, writer):
+    """
+    Unpivots each row into (country, mkt_name, dates, item, type, value) CSV
+    lines, one per non-empty price field. Rows without prices produce nothing.
+    """
+    loads = _default_loads()
+    rows = []
+    for line in _payload_lines(payload_str):
+        obj = loads(line)
+        ids = tuple(obj.get(col, "") for col in _ID_FIELDS)
+        for col, item, type_name in _PRICE_COLUMNS:
+            value = obj.get(col, "")
+            if not _is_empty(value):
+                rows.append(ids + (item, type_name, value))
+
+    buf.seek(0)
+    buf.truncate()
+    writer.writerows(rows)
+    return buf.getvalue()
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def emf_line(records, succeeded, failed, dropped, bytes_in, bytes_out, invocation_ms, record_us):
+    """
+    EMF log event for one invocation; CloudWatch Logs turns it into metrics
+    under EMF_NAMESPACE with an OutputFormat dimension.
+    """
+    record_us = sorted(record_us)
+    values = {
+        "Records": (records, "Count"),
+        "Succeeded": (succeeded, "Count"),
+        "Failed": (failed, "Count"),
+        "Dropped": (dropped, "Count"),
+        "BytesIn": (bytes_in, "Bytes"),
+        "BytesOut": (bytes_out, "Bytes"),
+        "InvocationMs": (round(invocation_ms, 3), "Milliseconds"),
+    }
+    if record_us:
+        values["RecordTransformP50Us"] = (round(_percentile(record_us, 0.50), 1), "Microseconds")
+        values["RecordTransformP99Us"] = (round(_percentile(record_us, 0.99), 1), "Microseconds")
+        values["RecordTransformMaxUs"] = (round(record_us[-1], 1), "Microseconds")
+
+    doc = {"OutputFormat": OUTPUT_FORMAT}
+    doc.update({name: value for name, (value, _) in values.items()})
+    doc["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [{
+            "Namespace": EMF_NAMESPACE,
+            "Dimensions": [["OutputFormat"]],
+            "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in values.items()],
+        }],
+    }
+    return json.dumps(doc, separators=(",", ":"))
+
+
 def lambda_handler(event, context):
     output = []
     succeeded = 0
     failed = 0
 
+    # only measured when EMF is on, so the default path pays nothing
+    emf = EMF_METRICS
+    started = time.perf_counter()
+    record_us = []
+    dropped = 0
+    bytes_in = 0
+    bytes_out = 0
+
+    # reused for every record of the batch by the fast path
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
     for record in event["records"]:
         record_id = record["recordId"]
+        if emf:
+            record_started = time.perf_counter()
+            bytes_in += len(record["data"])
 
         try:
             # 1) decode base64 -> bytes
@@ -100,23 +308,34 @@ def lambda_handler(event, context):
             # 2) bytes -> string
             payload_str = payload_bytes.decode("utf-8")
 
-            # 3) string -> dict
-            obj = json.loads(payload_str)
-
-            # 4) dict -> ordered row (missing keys become "")
-            row = [obj.get(col, "") for col in FIELD_ORDER]
+            # 3) string -> output line(s): the producer may aggregate several
+            #    JSON rows into one Kinesis record, one row per line
+            if OUTPUT_FORMAT == "json_sparse":
+                out_text = encode_json_sparse(payload_str)
+            elif OUTPUT_FORMAT == "long":
+                out_text = encode_long(payload_str, buf, writer)
+            elif FAST_TRANSFORM:
+                out_text = encode_csv_fast(payload_str, buf, writer)
+            else:
+                out_text = encode_csv_legacy(payload_str)
 
-            # 5) row -> CSV line (proper quoting)
-            buf = io.StringIO()
-            writer = csv.writer(buf)
-            writer.writerow(row)
-            csv_line = buf.getvalue()  # includes newline
+            if not out_text:
+                # long format and a row without any price: nothing to deliver
+                output.append({"recordId": record_id, "result": "Dropped", "data": record["data"]})
+                succeeded += 1
+                dropped += 1
+                if emf:
+                    record_us.append((time.perf_counter() - record_started) * 1e6)
+                continue
 
-            # 6) csv -> base64 string
-            data_b64 = base64.b64encode(csv_line.encode("utf-8")).decode("utf-8")
+            # 4) output -> base64 string
+            data_b64 = base64.b64encode(out_text.encode("utf-8")).decode("utf-8")
 
             output.append({"recordId": record_id, "result": "Ok", "data": data_b64})
             succeeded += 1
+            if emf:
+                record_us.append((time.perf_counter() - record_started) * 1e6)
+                bytes_out += len(data_b64)
 
         except Exception:
             
@@ -124,4 +343,9 @@ def lambda_handler(event, context):
             failed += 1
 
     print(f"Processing completed. Successful {succeeded}, Failed {failed}.")
+    if emf:
+        print(emf_line(
+            len(output), succeeded, failed, dropped, bytes_in, bytes_out,
+            (time.perf_counter() - started) * 1000, record_us,
+        ))
     return {"records": output}
\ No newline at end of file
@@ -0,0 +1,14 @@
+-- Change tracking for the incremental transform: the stream's offset is the
+-- watermark, so each SNOWPARK_TRANSFORM run only reads rows Snowpipe loaded
+-- since the previous run. Created without SHOW_INITIAL_ROWS, it starts at the
+-- current end of RAW_DATA (rows already in CLEANSED_FOOD_DATA_NEW are not
+-- reprocessed); add SHOW_INITIAL_ROWS = TRUE to backfill an empty CLEAN table.
+CREATE OR REPLACE STREAM Food_Market_DB.RAW.RAW_DATA_STREAM
+  ON TABLE Food_Market_DB.RAW.RAW_DATA
+  APPEND_ONLY = TRUE;
+
+-- Rows taken off the stream but not yet committed to CLEAN. The procedure
+-- empties it in the same transaction that writes CLEAN and ROW_COUNT, so a
+-- failed run leaves its batch here to be picked up by the next one.
+CREATE TABLE IF NOT EXISTS Food_Market_DB.RAW.RAW_DATA_DELTA
+  LIKE Food_Market_DB.RAW.RAW_DATA;
@@ -0,0 +1,9 @@
+-- Landing table for OUTPUT_FORMAT=long: one row per non-empty price field.
+CREATE OR REPLACE TABLE FOOD_MARKET_DB.RAW.RAW_DATA_LONG (
+    COUNTRY VARCHAR,
+    MKT_NAME VARCHAR,
+    DATES DATE,
+    ITEM VARCHAR,
+    TYPE VARCHAR,
+    VALUE FLOAT
+);
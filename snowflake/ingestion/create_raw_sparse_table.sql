@@ -0,0 +1,33 @@
+-- Landing table for OUTPUT_FORMAT=json_sparse: one VARIANT per source row.
+CREATE OR REPLACE TABLE FOOD_MARKET_DB.RAW.RAW_DATA_SPARSE (
+    RECORD VARIANT,
+    FILE_NAME VARCHAR,
+    LOADED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+);
+
+-- Identifier columns typed, prices left in the VARIANT
+-- (e.g. RECORD:c_rice::FLOAT; absent keys read as NULL).
+CREATE OR REPLACE VIEW FOOD_MARKET_DB.RAW.RAW_DATA_SPARSE_V AS
+SELECT
+    RECORD:country::VARCHAR AS COUNTRY,
+    RECORD:mkt_name::VARCHAR AS MKT_NAME,
+    RECORD:dates::DATE AS DATES,
+    RECORD:year::INT AS YEAR,
+    RECORD:month::INT AS MONTH,
+    RECORD
+FROM FOOD_MARKET_DB.RAW.RAW_DATA_SPARSE;
+
+-- Same data in long format: one row per non-empty price field.
+CREATE OR REPLACE VIEW FOOD_MARKET_DB.RAW.RAW_DATA_SPARSE_LONG_V AS
+SELECT
+    s.RECORD:country::VARCHAR AS COUNTRY,
+    s.RECORD:mkt_name::VARCHAR AS MKT_NAME,
+    s.RECORD:dates::DATE AS DATES,
+    UPPER(REGEXP_SUBSTR(f.KEY, '^[^_]+_(.+)$', 1, 1, 'e', 1)) AS ITEM,
+    DECODE(SPLIT_PART(f.KEY, '_', 1),
+        'o', 'OPEN', 'h', 'HIGH', 'l', 'LOW', 'c', 'CLOSE',
+        'inflation', 'INFLATION', 'trust', 'TRUST') AS TYPE,
+    f.VALUE::FLOAT AS VALUE
+FROM FOOD_MARKET_DB.RAW.RAW_DATA_SPARSE s,
+     LATERAL FLATTEN(INPUT => s.RECORD) f
+WHERE SPLIT_PART(f.KEY, '_', 1) IN ('o', 'h', 'l', 'c', 'inflation', 'trust');
@@ -0,0 +1,12 @@
+-- Firehose writes long-format CSV files under data/long/ of the existing stage.
+-- MY_SNOWPIPE reads the whole stage, so pause it while this mode is active:
+--   ALTER PIPE Food_Market_DB.RAW.MY_SNOWPIPE SET PIPE_EXECUTION_PAUSED = TRUE;
+CREATE OR REPLACE PIPE Food_Market_DB.RAW.MY_SNOWPIPE_LONG
+  AUTO_INGEST = TRUE
+AS
+COPY INTO Food_Market_DB.RAW.RAW_DATA_LONG
+FROM @Food_Market_DB.RAW.S3_STAGE/long/
+FILE_FORMAT = (FORMAT_NAME = Food_Market_DB.RAW.CSV_FORMAT)
+ON_ERROR = 'CONTINUE';
+
+DESC PIPE Food_Market_DB.RAW.MY_SNOWPIPE_LONG;
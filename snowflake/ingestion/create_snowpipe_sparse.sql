@@ -0,0 +1,15 @@
+-- Firehose writes json_sparse files under data/sparse/ of the existing stage.
+-- MY_SNOWPIPE reads the whole stage, so pause it while this mode is active:
+--   ALTER PIPE Food_Market_DB.RAW.MY_SNOWPIPE SET PIPE_EXECUTION_PAUSED = TRUE;
+CREATE OR REPLACE PIPE Food_Market_DB.RAW.MY_SNOWPIPE_SPARSE
+  AUTO_INGEST = TRUE
+AS
+COPY INTO Food_Market_DB.RAW.RAW_DATA_SPARSE (RECORD, FILE_NAME)
+FROM (
+    SELECT $1, METADATA$FILENAME
+    FROM @Food_Market_DB.RAW.S3_STAGE/sparse/
+)
+FILE_FORMAT = (FORMAT_NAME = Food_Market_DB.RAW.JSON_FORMAT)
+ON_ERROR = 'CONTINUE';
+
+DESC PIPE Food_Market_DB.RAW.MY_SNOWPIPE_SPARSE;
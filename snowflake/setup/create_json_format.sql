@@ -0,0 +1,6 @@
+-- For the Lambda's OUTPUT_FORMAT=json_sparse: one JSON object per line,
+-- only the fields that hold a value.
+CREATE OR REPLACE FILE FORMAT FOOD_MARKET_DB.RAW.JSON_FORMAT
+  TYPE = JSON
+  STRIP_OUTER_ARRAY = FALSE
+  COMPRESSION = AUTO;
@@ -4,4 +4,4 @@ CREATE OR REPLACE TASK Food_Market_DB.RAW.SNOWPARK_TRANSFORM_TASK
 AS
   CALL Food_Market_DB.RAW.SNOWPARK_TRANSFORM();
 
-ALTER TASK Food_Market_DB.RAW.SNOWPARK_TRANSFORM_TASK RESUME;
\ No newline at end of file
+ALTER TASK Food_Market_DB.RAW.SNOWPARK_TRANSFORM_TASK RESUME;
@@ -1,88 +1,84 @@
 import snowflake.snowpark as snowpark
-from snowflake.snowpark.functions import col
-import pandas as pd
+from snowflake.snowpark.functions import avg, col, iff, lit, regexp_replace
+
+RAW_TABLE = 'Food_Market_DB.RAW.RAW_DATA'
+RAW_STREAM = 'Food_Market_DB.RAW.RAW_DATA_STREAM'
+DELTA_TABLE = 'Food_Market_DB.RAW.RAW_DATA_DELTA'
+ROW_COUNT_TABLE = 'Food_Market_DB.RAW.ROW_COUNT'
+CLEAN_TABLE = 'Food_Market_DB.CLEAN.CLEANSED_FOOD_DATA_NEW'
+BATCH_TABLE = 'CLEANSED_FOOD_DATA_BATCH'
+
+KEY_COLUMNS = ['COUNTRY', 'MKT_NAME', 'DATES']
+# RAW_DATA price columns are <PREFIX>_<ITEM>, e.g. O_MEAT_BEEF_MINCED
+TYPE_PREFIXES = {'O': 'OPEN', 'H': 'HIGH', 'L': 'LOW', 'C': 'CLOSE', 'INFLATION': 'INFLATION', 'TRUST': 'TRUST'}
+TYPE_COLUMNS = ['CLOSE', 'HIGH', 'INFLATION', 'LOW', 'OPEN', 'TRUST']
+CLEAN_COLUMNS = KEY_COLUMNS + ['ITEM'] + TYPE_COLUMNS
+
+
+def take_new_rows(session: snowpark.Session, raw_columns):
+    """
+    Moves the rows RAW_DATA_STREAM has seen since the last run into
+    RAW_DATA_DELTA. Reading a stream in a DML statement advances its offset
+    when the statement commits, so this is the watermark: each row reaches
+    the delta table exactly once. Rows a failed run left behind stay there.
+    """
+    cols = ', '.join(raw_columns)
+    session.sql(f'INSERT INTO {DELTA_TABLE} ({cols}) SELECT {cols} FROM {RAW_STREAM}').collect()
+
+
+def price_columns(raw_columns):
+    return [c for c in raw_columns if c.split('_', 1)[0] in TYPE_PREFIXES and '_' in c]
+
+
+def reshape(raw: snowpark.DataFrame, raw_columns) -> snowpark.DataFrame:
+    """
+    One row per (COUNTRY, MKT_NAME, DATES, ITEM) with a column per price
+    type, computed in the warehouse. UNPIVOT drops empty cells, so only the
+    few filled prices are carried into the aggregation, and ITEM keeps
+    everything after the type prefix (MEAT_BEEF_MINCED, not MEAT).
+    Duplicate source rows are averaged.
+    """
+    prices = price_columns(raw_columns)
+    cells = raw.select(KEY_COLUMNS + prices).unpivot('VALUE', 'COLUMN_NAME', prices)
+    cells = cells.with_column('ITEM', regexp_replace(col('COLUMN_NAME'), '^[^_]+_', ''))
+
+    by_type = [
+        avg(iff(col('COLUMN_NAME').startswith(lit(prefix + '_')), col('VALUE'), lit(None))).alias(type_name)
+        for prefix, type_name in TYPE_PREFIXES.items()
+    ]
+    return cells.group_by(KEY_COLUMNS + ['ITEM']).agg(*by_type).select(CLEAN_COLUMNS)
 
-def main(session: snowpark.Session):
-    tableName = 'Food_Market_DB.RAW.RAW_DATA'
-    snow_table = session.table(tableName)
-
-    df = snow_table.to_pandas()
-    print(df.shape)
-
-    tableName = 'Food_Market_DB.RAW.ROW_COUNT'
-    row_count_table = session.table(tableName)
-    row_count_df = row_count_table.to_pandas()
-
-    if row_count_df.shape[0] != 0:
-        row_count_df = row_count_df[row_count_df['INDEX_NO'] == max(row_count_df['INDEX_NO'])].reset_index(drop=True)
-        old_rows = row_count_df['NO_OF_ROWS'][0]
-
-        
-        df = df.sort_values(by='YEAR').reset_index(drop=True)
-        df1 = df.tail(df.shape[0] - old_rows)
-    else:
-        df1 = df
-
-    print('Shape 1:', df1.shape)
-    print('Shape 1:', df1['DATES'].unique())
-
-    df_notnull = df1.loc[:, df1.notnull().any()]
-
-    keep_cols = ['COUNTRY', 'MKT_NAME', 'DATES']
-    df_1 = df_notnull[keep_cols + [c for c in df_notnull.columns if c.startswith(('O_', 'H_', 'L_', 'C_', 'INFLATION_', 'TRUST_'))]]
-
-    final_component_df = df_1.melt(id_vars=keep_cols, var_name='ITEM', value_name='VALUE')
-
-    final_component_df.insert(loc=4, column='TYPE', value=final_component_df['ITEM'].str.split('_').str[0])
-    final_component_df['TYPE'] = final_component_df['TYPE'].replace({'O': 'OPEN', 'H': 'HIGH', 'L': 'LOW', 'C': 'CLOSE'})
-    final_component_df['ITEM'] = final_component_df['ITEM'].str.split('_').str[1]
 
-    pivot_type_df = final_component_df.pivot_table(
-        index=['COUNTRY', 'MKT_NAME', 'DATES', 'ITEM'],
-        values='VALUE',
-        columns='TYPE'
-    ).reset_index()
-
-    present_cols = pivot_type_df.columns.tolist()
-    expected_cols = ['COUNTRY', 'MKT_NAME', 'DATES', 'ITEM', 'CLOSE', 'HIGH', 'INFLATION', 'LOW', 'OPEN', 'TRUST']
-
-    add_cols = list(set(expected_cols) - set(present_cols))
-    if add_cols:
-        for c in add_cols:
-            pivot_type_df[c] = 0
-
-    final_df = pivot_type_df[expected_cols]
-
-    print('Shape CLEANSED_FOOD_DATA_NEW:', pivot_type_df.shape)
-    print(pivot_type_df['DATES'].unique())
-
-    if row_count_df.shape[0] == 0:
-        d = {
-            'INDEX_NO': 1,
-            'NO_OF_ROWS': df.shape[0],
-            'DATE': pd.Timestamp.now(),
-            'NO_OF_ROWS_ADDED': df.shape[0],
-            'NO_OF_ROWS_IN_TRANSFORMED_TABLE': pivot_type_df.shape[0]
-        }
-    else:
-        d = {
-            'INDEX_NO': int(row_count_df['INDEX_NO'][0]) + 1,
-            'NO_OF_ROWS': df.shape[0],
-            'DATE': pd.Timestamp.now(),
-            'NO_OF_ROWS_ADDED': int(df.shape[0] - old_rows),
-            'NO_OF_ROWS_IN_TRANSFORMED_TABLE': pivot_type_df.shape[0]
-        }
-
-
-    session.create_dataframe(pd.DataFrame([d])).write.save_as_table(
-        'Food_Market_DB.RAW.ROW_COUNT',
-        mode="append"
-    )
-
-    snow_component = session.create_dataframe(final_df)
-    snow_component.write.save_as_table(
-        "Food_Market_DB.CLEAN.CLEANSED_FOOD_DATA_NEW",
-        mode="append"
-    )
-
-    return snow_component
\ No newline at end of file
+def main(session: snowpark.Session):
+    raw_columns = session.table(RAW_TABLE).columns
+    take_new_rows(session, raw_columns)
+
+    delta = session.table(DELTA_TABLE)
+    rows_added = delta.count()
+    print('Rows added:', rows_added)
+    if rows_added == 0:
+        return session.table(CLEAN_TABLE).limit(0)
+
+    # Materialized first: creating the temporary table is DDL and would commit
+    # an open transaction.
+    reshape(delta, raw_columns).write.save_as_table(BATCH_TABLE, mode='overwrite', table_type='temporary')
+    rows_transformed = session.table(BATCH_TABLE).count()
+    print('Rows CLEANSED_FOOD_DATA_NEW:', rows_transformed)
+
+    # CLEAN, ROW_COUNT and the emptied delta table commit together, so a
+    # failure anywhere here leaves the batch in RAW_DATA_DELTA for the next run.
+    cols = ', '.join(CLEAN_COLUMNS)
+    session.sql('BEGIN').collect()
+    try:
+        session.sql(f'INSERT INTO {CLEAN_TABLE} ({cols}) SELECT {cols} FROM {BATCH_TABLE}').collect()
+        session.sql(
+            f'INSERT INTO {ROW_COUNT_TABLE} (NO_OF_ROWS, DATE, NO_OF_ROWS_ADDED, NO_OF_ROWS_IN_TRANSFORMED_TABLE) '
+            f'SELECT (SELECT COUNT(*) FROM {RAW_TABLE}), CURRENT_TIMESTAMP()::TIMESTAMP_NTZ, {rows_added}, {rows_transformed}'
+        ).collect()
+        session.sql(f'DELETE FROM {DELTA_TABLE}').collect()
+        session.sql('COMMIT').collect()
+    except Exception:
+        session.sql('ROLLBACK').collect()
+        raise
+
+    return session.table(BATCH_TABLE)
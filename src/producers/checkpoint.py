@@ -0,0 +1,91 @@
+"""
+checkpoint.py
+
+Durable progress for long producer runs, kept in a small SQLite file.
+
+After every fully acknowledged batch the producer records, per (year, country)
+slice, the next offset to fetch (in the API's filtered-row space, which is the
+same for /fetch_data pages and /export), the last next_cursor and the records
+sent so far. A restarted run resumes each slice from there, and fan-out runs
+skip slices already marked completed.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    year INTEGER NOT NULL,
+    country TEXT NOT NULL,
+    next_offset INTEGER NOT NULL,
+    next_cursor TEXT,
+    records_sent INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (year, country)
+)
+"""
+
+
+class CheckpointStore:
+    """
+    Thread-safe; one connection shared by all slices of a run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+
+    def load(self, year: int, country: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT next_offset, next_cursor, records_sent, completed, updated_at "
+                "FROM checkpoints WHERE year = ? AND country = ?",
+                (year, country),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "next_offset": row[0],
+            "next_cursor": row[1],
+            "records_sent": row[2],
+            "completed": bool(row[3]),
+            "updated_at": row[4],
+        }
+
+    def save(
+        self,
+        year: int,
+        country: str,
+        next_offset: int,
+        records_sent: int,
+        next_cursor: Optional[str] = None,
+        completed: bool = False,
+    ):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO checkpoints (year, country, next_offset, next_cursor, records_sent, completed, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (year, country) DO UPDATE SET "
+                "next_offset = excluded.next_offset, next_cursor = excluded.next_cursor, "
+                "records_sent = excluded.records_sent, completed = excluded.completed, updated_at = excluded.updated_at",
+                (year, country, int(next_offset), next_cursor, int(records_sent), int(completed), time.time()),
+            )
+
+    def completed_slices(self) -> Set[Tuple[int, str]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT year, country FROM checkpoints WHERE completed = 1").fetchall()
+        return {(int(y), str(c)) for y, c in rows}
+
+    def reset(self, year: int, country: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE year = ? AND country = ?", (year, country))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,141 @@
+"""
+fanout.py
+
+Runs many (year, country) slices of a backfill on a bounded worker pool and
+reports aggregate throughput and ETA while it runs.
+
+The pool is thread based: a slice spends its time waiting on the API and on
+Kinesis, and all slices share one rate limiter, metrics and the HTTP/boto
+clients, which is simpler in one process than across processes.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("api_to_kds")
+
+Slice = Tuple[int, str]
+
+
+def parse_years(spec: str) -> List[int]:
+    """
+    "2008-2011" -> [2008, 2009, 2010, 2011]; "2008,2010" -> [2008, 2010]
+    """
+    years: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = (int(x) for x in part.split("-", 1))
+            years.extend(range(lo, hi + 1))
+        else:
+            years.append(int(part))
+    return sorted(set(years))
+
+
+def parse_countries(spec: str) -> List[str]:
+    return [c.strip() for c in spec.split(",") if c.strip()]
+
+
+class FanoutProgress:
+    """
+    Thread-safe progress for a fan-out run, logged periodically.
+    expected_rows (per slice, when the API reported it) drives the ETA.
+    """
+
+    def __init__(self, slices: Sequence[Slice], expected_rows: Optional[Dict[Slice, int]] = None):
+        self.slices = list(slices)
+        self.expected_rows = expected_rows or {}
+        self.started = time.monotonic()
+
+        self._lock = threading.Lock()
+        self.done: Dict[Slice, int] = {}
+        self.failed: Dict[Slice, str] = {}
+        self.running: Dict[Slice, float] = {}
+
+    def slice_started(self, s: Slice):
+        with self._lock:
+            self.running[s] = time.monotonic()
+
+    def slice_finished(self, s: Slice, rows: int):
+        with self._lock:
+            self.running.pop(s, None)
+            self.done[s] = rows
+
+    def slice_failed(self, s: Slice, error: str):
+        with self._lock:
+            self.running.pop(s, None)
+            self.failed[s] = error
+
+    def report(self, rows_sent: int) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            rate = rows_sent / elapsed if elapsed > 0 else 0.0
+            expected = sum(self.expected_rows.values())
+            remaining = max(0, expected - rows_sent) if expected else None
+            return {
+                "slices_total": len(self.slices),
+                "slices_done": len(self.done),
+                "slices_failed": len(self.failed),
+                "slices_running": len(self.running),
+                "rows_sent": rows_sent,
+                "rows_expected": expected or None,
+                "elapsed_sec": round(elapsed, 1),
+                "rows_per_sec": round(rate, 1),
+                "eta_sec": round(remaining / rate, 1) if remaining is not None and rate > 0 else None,
+            }
+
+
+def run_fanout(
+    slices: Sequence[Slice],
+    run_slice: Callable[[int, str], int],
+    rows_sent: Callable[[], int],
+    max_concurrent_slices: int = 4,
+    expected_rows: Optional[Dict[Slice, int]] = None,
+    report_interval_sec: float = 30.0,
+) -> Dict[str, Any]:
+    """
+    Runs run_slice(year, country) for every slice, at most
+    max_concurrent_slices at a time. rows_sent() returns the global count of
+    delivered rows (for throughput/ETA). A failing slice is logged and the
+    others keep going; the final report lists failures.
+    """
+    progress = FanoutProgress(slices, expected_rows)
+    stop = threading.Event()
+
+    def reporter():
+        while not stop.wait(report_interval_sec):
+            logger.info("Fan-out progress: %s", progress.report(rows_sent()))
+
+    def worker(s: Slice) -> int:
+        progress.slice_started(s)
+        return run_slice(*s)
+
+    logger.info("Fan-out: %s slice(s), concurrency=%s", len(progress.slices), max_concurrent_slices)
+    reporter_thread = threading.Thread(target=reporter, name="fanout-progress", daemon=True)
+    reporter_thread.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrent_slices, thread_name_prefix="slice") as pool:
+            futures = {pool.submit(worker, s): s for s in progress.slices}
+            for fut in as_completed(futures):
+                s = futures[fut]
+                try:
+                    rows = fut.result()
+                except Exception as e:
+                    logger.error("Slice year=%s country=%s failed: %s", s[0], s[1], e)
+                    progress.slice_failed(s, str(e))
+                else:
+                    logger.info("Slice year=%s country=%s done: %s row(s)", s[0], s[1], rows)
+                    progress.slice_finished(s, rows)
+    finally:
+        stop.set()
+        reporter_thread.join()
+
+    report = progress.report(rows_sent())
+    report["failed"] = [{"year": y, "country": c, "error": e} for (y, c), e in progress.failed.items()]
+    return report
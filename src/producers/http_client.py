@@ -0,0 +1,226 @@
+"""
+http_client.py
+
+Pooled HTTP clients for the producer's calls to the API.
+
+All synchronous calls share one requests.Session, so pages reuse keep-alive
+TCP/TLS connections to App Runner instead of opening a new one per request,
+and every request asks for a compressed response (gzip, plus br when the
+brotli package is installed; requests/httpx decode both transparently).
+
+AsyncPageFetcher is the httpx variant for the pipelined mode: one event loop
+thread multiplexes all in-flight page fetches over a single connection pool
+instead of tying up one thread per request. httpx is optional and only
+needed when that variant is selected.
+
+Both retry 429 / 5xx / timeouts with jittered backoff (honouring Retry-After)
+and report every outcome to an optional ApiRateLimiter, so the API request
+rate adapts to what the service can take.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.producers.rate_limit import ApiRateLimiter
+from src.producers.telemetry import TIMINGS
+
+try:
+    import brotli  # noqa: F401  (presence enables "br" decoding in urllib3/httpx)
+    ACCEPT_ENCODING = "br, gzip"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger("api_to_kds")
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT_SEC = 60
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+API_MAX_ATTEMPTS = 5
+API_BACKOFF_BASE_SEC = 0.5
+API_BACKOFF_MAX_SEC = 10.0
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def build_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Session whose per-host pool keeps up to pool_size connections alive
+    (size it to the number of threads calling the API concurrently).
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    return session
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def configure_session(pool_size: int) -> requests.Session:
+    """
+    Replaces the shared session with one sized for pool_size concurrent
+    callers. Call before any work starts.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = build_session(pool_size)
+    return _session
+
+
+def retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """
+    Retry-After (seconds form) when the server sent one, else full jitter.
+    """
+    if retry_after:
+        try:
+            return min(API_BACKOFF_MAX_SEC, max(0.0, float(retry_after)))
+        except ValueError:
+            pass  # HTTP-date form: fall back to our own backoff
+    return random.uniform(0, min(API_BACKOFF_MAX_SEC, API_BACKOFF_BASE_SEC * (2 ** attempt)))
+
+
+def get_json(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    api_limiter: Optional[ApiRateLimiter] = None,
+    max_attempts: int = API_MAX_ATTEMPTS,
+) -> Any:
+    """
+    GET over the shared session, returning the parsed JSON body. Retryable
+    failures are retried up to max_attempts; other HTTP errors raise at once.
+    """
+    session = get_session()
+    attempt = 0
+    while True:
+        attempt += 1
+        if api_limiter is not None:
+            api_limiter.acquire()
+
+        retry_after = None
+        try:
+            resp = session.get(url, params=params, timeout=DEFAULT_TIMEOUT_SEC)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            reason, error = type(e).__name__, e
+        else:
+            if resp.status_code not in RETRYABLE_STATUS:
+                resp.raise_for_status()
+                if api_limiter is not None:
+                    api_limiter.on_success()
+                return resp.json()
+            reason, error = f"HTTP {resp.status_code}", requests.HTTPError(f"HTTP {resp.status_code} for {resp.url}", response=resp)
+            retry_after = resp.headers.get("Retry-After")
+
+        if api_limiter is not None:
+            api_limiter.on_error(reason)
+        if attempt >= max_attempts:
+            raise error
+        delay = retry_delay(attempt, retry_after)
+        logger.warning("API call failed (%s); retry %s/%s in %.2fs", reason, attempt, max_attempts - 1, delay)
+        time.sleep(delay)
+
+
+class AsyncPageFetcher:
+    """
+    httpx.AsyncClient running on a private event loop thread.
+    submit() can be called from any thread and returns a
+    concurrent.futures.Future with the parsed JSON body, so it drops in where
+    a ThreadPoolExecutor.submit(...) future was used.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_POOL_SIZE,
+        timeout_sec: float = DEFAULT_TIMEOUT_SEC,
+        api_limiter: Optional[ApiRateLimiter] = None,
+        max_attempts: int = API_MAX_ATTEMPTS,
+    ):
+        if httpx is None:
+            raise RuntimeError("The async HTTP client needs httpx (pip install httpx)")
+        self.api_limiter = api_limiter
+        self.max_attempts = max_attempts
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="api-fetch-async", daemon=True)
+        self._thread.start()
+
+        async def create():
+            return httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                timeout=timeout_sec,
+                headers={"Accept-Encoding": ACCEPT_ENCODING},
+            )
+
+        self._client = asyncio.run_coroutine_threadsafe(create(), self._loop).result()
+
+    async def _get_json(self, url: str, params: Dict[str, Any]) -> Any:
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.api_limiter is not None:
+                # the bucket blocks, so wait for it off the event loop
+                await self._loop.run_in_executor(None, self.api_limiter.acquire)
+
+            retry_after = None
+            try:
+                resp = await self._client.get(url, params=params)
+            except httpx.TransportError as e:  # timeouts, connection errors
+                reason, error = type(e).__name__, e
+            else:
+                if resp.status_code not in RETRYABLE_STATUS:
+                    resp.raise_for_status()
+                    if self.api_limiter is not None:
+                        self.api_limiter.on_success()
+                    return resp.json()
+                reason, error = f"HTTP {resp.status_code}", httpx.HTTPStatusError(
+                    f"HTTP {resp.status_code} for {resp.url}", request=resp.request, response=resp
+                )
+                retry_after = resp.headers.get("Retry-After")
+
+            if self.api_limiter is not None:
+                self.api_limiter.on_error(reason)
+            if attempt >= self.max_attempts:
+                raise error
+            delay = retry_delay(attempt, retry_after)
+            logger.warning("API call failed (%s); retry %s/%s in %.2fs", reason, attempt, self.max_attempts - 1, delay)
+            await asyncio.sleep(delay)
+
+    async def _timed_get_json(self, url: str, params: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return await self._get_json(url, params)
+        finally:
+            TIMINGS.observe("fetch_page", (time.perf_counter() - started) * 1000)
+
+    def submit(self, url: str, params: Dict[str, Any]) -> Future:
+        return asyncio.run_coroutine_threadsafe(self._timed_get_json(url, params), self._loop)
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,253 @@
+"""
+partitioning.py
+
+Partition key strategies for the Kinesis producer, plus a running per-key /
+per-shard histogram that reports hot keys during a run.
+
+Strategies (all return (partition_key, explicit_hash_key or None)):
+  field          one record field, e.g. mkt_name (fallback: the record's
+                 country, then the default key)
+  composite      several fields joined with "|", e.g. country|mkt_name
+  salted         base key + "#<n>" with n random in [0, salt_buckets):
+                 spreads a hot key over several shards, but records of one
+                 key are no longer ordered relative to each other
+  explicit-hash  keeps the base key, but pins each key to a shard chosen by
+                 ExplicitHashKey from the ListShards ranges, always picking the
+                 least-loaded shard for a new key (order per key is kept)
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("api_to_kds")
+
+STRATEGIES = ("field", "composite", "salted", "explicit-hash")
+
+
+class PartitionStrategy:
+    name = "base"
+
+    def assign(self, item: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        raise NotImplementedError
+
+    def routing_key(self, item: Dict[str, Any]) -> str:
+        """
+        Key whose records must stay ordered (used to pin rows to one sender).
+        """
+        return self.assign(item)[0]
+
+    def record_load(self, shard_id: str, nbytes: int):
+        """
+        Feedback from delivered records; only load-aware strategies use it.
+        """
+
+
+class FieldPartitioner(PartitionStrategy):
+    name = "field"
+
+    def __init__(self, field: Optional[str], default_key: str = "1", fallback_field: Optional[str] = "country"):
+        self.field = field
+        self.default_key = default_key
+        self.fallback_field = fallback_field
+
+    def assign(self, item: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        for f in (self.field, self.fallback_field):
+            if f and f in item and item[f] not in (None, ""):
+                return str(item[f]), None
+        return self.default_key, None
+
+
+class CompositePartitioner(PartitionStrategy):
+    name = "composite"
+
+    def __init__(self, fields: Sequence[str] = ("country", "mkt_name"), default_key: str = "1"):
+        self.fields = tuple(fields)
+        self.default_key = default_key
+
+    def assign(self, item: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        parts = [str(item[f]) for f in self.fields if item.get(f) not in (None, "")]
+        return ("|".join(parts) if parts else self.default_key), None
+
+
+class SaltedPartitioner(PartitionStrategy):
+    name = "salted"
+
+    def __init__(self, base: PartitionStrategy, salt_buckets: int = 4):
+        self.base = base
+        self.salt_buckets = max(1, salt_buckets)
+
+    def assign(self, item: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        key, _ = self.base.assign(item)
+        return f"{key}#{random.randrange(self.salt_buckets)}", None
+
+    def routing_key(self, item: Dict[str, Any]) -> str:
+        return self.base.assign(item)[0]
+
+
+class ExplicitHashPartitioner(PartitionStrategy):
+    name = "explicit-hash"
+
+    def __init__(self, base: PartitionStrategy, shards: List[Tuple[str, int, int]]):
+        if not shards:
+            raise ValueError("explicit-hash partitioning needs at least one open shard")
+        self.base = base
+        # (shard_id, start, end) sorted by start
+        self.shards = sorted(shards, key=lambda s: s[1])
+        self._key_to_hash: Dict[str, str] = {}
+        self._shard_load: Dict[str, int] = {s[0]: 0 for s in self.shards}
+        self._shard_keys: Dict[str, int] = {s[0]: 0 for s in self.shards}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_stream(cls, kinesis_client, stream_name: str, base: PartitionStrategy) -> "ExplicitHashPartitioner":
+        return cls(base, list_open_shards(kinesis_client, stream_name))
+
+    def assign(self, item: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        key, _ = self.base.assign(item)
+        ehk = self._key_to_hash.get(key)
+        if ehk is None:
+            with self._lock:
+                ehk = self._key_to_hash.get(key)
+                if ehk is None:
+                    # least bytes delivered so far; ties (e.g. at start) go to fewest keys
+                    shard_id, start, end = min(self.shards, key=lambda s: (self._shard_load[s[0]], self._shard_keys[s[0]]))
+                    ehk = str(start + (end - start) // 2)
+                    self._key_to_hash[key] = ehk
+                    self._shard_keys[shard_id] += 1
+        return key, ehk
+
+    def record_load(self, shard_id: str, nbytes: int):
+        """
+        Feeds delivered bytes back so new keys go to the least-loaded shard.
+        """
+        with self._lock:
+            if shard_id in self._shard_load:
+                self._shard_load[shard_id] += nbytes
+
+
+def list_open_shards(kinesis_client, stream_name: str) -> List[Tuple[str, int, int]]:
+    """
+    Returns (shard_id, start_hash, end_hash) for every open shard.
+    """
+    shards = []
+    kwargs: Dict[str, Any] = {"StreamName": stream_name}
+    while True:
+        resp = kinesis_client.list_shards(**kwargs)
+        for shard in resp.get("Shards", []):
+            if shard.get("SequenceNumberRange", {}).get("EndingSequenceNumber"):
+                continue  # closed (split/merged) shard
+            rng = shard["HashKeyRange"]
+            shards.append((shard["ShardId"], int(rng["StartingHashKey"]), int(rng["EndingHashKey"])))
+        token = resp.get("NextToken")
+        if not token:
+            return shards
+        kwargs = {"NextToken": token}
+
+
+def build_partitioner(
+    strategy: str,
+    field: Optional[str] = "mkt_name",
+    default_key: str = "1",
+    composite_fields: Sequence[str] = ("country", "mkt_name"),
+    salt_buckets: int = 4,
+    kinesis_client=None,
+    stream_name: Optional[str] = None,
+) -> PartitionStrategy:
+    if strategy == "field":
+        return FieldPartitioner(field, default_key)
+    if strategy == "composite":
+        return CompositePartitioner(composite_fields, default_key)
+    if strategy == "salted":
+        return SaltedPartitioner(FieldPartitioner(field, default_key), salt_buckets)
+    if strategy == "explicit-hash":
+        if kinesis_client is None or not stream_name:
+            raise ValueError("explicit-hash partitioning needs a Kinesis client and stream name for ListShards")
+        return ExplicitHashPartitioner.from_stream(kinesis_client, stream_name, FieldPartitioner(field, default_key))
+    raise ValueError(f"Unknown partition strategy {strategy!r}. Expected one of {STRATEGIES}")
+
+
+class KeyStats:
+    """
+    Running per-partition-key and per-shard record/byte histogram.
+
+    A key is reported as hot when it carries more than hot_share of all bytes
+    sent so far (once at least min_records have been seen). Throttled records
+    are counted per key too, which is what stream-level metrics can't tell us.
+    """
+
+    def __init__(self, hot_share: float = 0.2, log_interval_sec: float = 30.0, min_records: int = 1000, top_n: int = 5):
+        self.hot_share = hot_share
+        self.log_interval_sec = log_interval_sec
+        self.min_records = min_records
+        self.top_n = top_n
+
+        self._lock = threading.Lock()
+        self.key_records: Dict[str, int] = defaultdict(int)
+        self.key_bytes: Dict[str, int] = defaultdict(int)
+        self.key_throttles: Dict[str, int] = defaultdict(int)
+        self.shard_records: Dict[str, int] = defaultdict(int)
+        self.shard_bytes: Dict[str, int] = defaultdict(int)
+        self.total_records = 0
+        self.total_bytes = 0
+        self._last_log = time.monotonic()
+
+    def record_sent(self, partition_key: str, shard_id: Optional[str], nbytes: int):
+        with self._lock:
+            self.key_records[partition_key] += 1
+            self.key_bytes[partition_key] += nbytes
+            if shard_id:
+                self.shard_records[shard_id] += 1
+                self.shard_bytes[shard_id] += nbytes
+            self.total_records += 1
+            self.total_bytes += nbytes
+
+    def record_throttled(self, partition_key: str):
+        with self._lock:
+            self.key_throttles[partition_key] += 1
+
+    def hot_keys(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            if self.total_records < self.min_records or not self.total_bytes:
+                return []
+            return sorted(
+                ((k, b / self.total_bytes) for k, b in self.key_bytes.items() if b / self.total_bytes > self.hot_share),
+                key=lambda kv: -kv[1],
+            )
+
+    def maybe_log(self):
+        """
+        Logs hot keys at most every log_interval_sec (cheap to call per batch).
+        """
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval_sec:
+            return
+        self._last_log = now
+        for key, share in self.hot_keys():
+            logger.warning(
+                "Hot partition key %r: %.0f%% of bytes sent, %s throttled record(s)",
+                key, share * 100, self.key_throttles.get(key, 0),
+            )
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            top = sorted(self.key_bytes.items(), key=lambda kv: -kv[1])[: self.top_n]
+            throttled = sorted(self.key_throttles.items(), key=lambda kv: -kv[1])[: self.top_n]
+            return {
+                "keys": len(self.key_records),
+                "top_keys_by_bytes": [
+                    {"key": k, "bytes": b, "records": self.key_records[k], "share": round(b / self.total_bytes, 4)}
+                    for k, b in top
+                ],
+                "top_keys_by_throttles": [{"key": k, "throttled": n} for k, n in throttled],
+                "shards": {
+                    s: {"records": self.shard_records[s], "bytes": self.shard_bytes[s]}
+                    for s in sorted(self.shard_bytes)
+                },
+            }
+
+
+KEY_STATS = KeyStats()
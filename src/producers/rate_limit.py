@@ -0,0 +1,301 @@
+"""
+rate_limit.py
+
+Token-bucket rate limiting shared by every worker of a producer run.
+
+A Kinesis shard accepts 1,000 records/s and 1 MiB/s of writes, so a run over
+N shards is sized to N times that. All slices and sender threads draw from the
+same StreamRateLimiter, which keeps a fan-out run from throttling itself.
+
+Budgets can be adaptive: an AimdController raises the rate additively while
+calls succeed and the budget is what holds the producer back, and cuts it
+multiplicatively on throttling / failures. The API (requests/s) and the
+stream (records/s + bytes/s) have separate budgets.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger("api_to_kds")
+
+SHARD_RECORDS_PER_SEC = 1000
+SHARD_BYTES_PER_SEC = 1024 * 1024
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire(n) blocks until n tokens are available.
+    A request larger than the burst size is paid for in burst-sized
+    installments, so it waits for its whole cost before it goes out instead
+    of passing on a full bucket.
+    """
+
+    def __init__(self, rate_per_sec: float, burst: Optional[float] = None):
+        self.rate = float(rate_per_sec)
+        self.burst = float(burst if burst is not None else rate_per_sec)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate_per_sec: float, burst: Optional[float] = None):
+        with self._lock:
+            self._refill()
+            self.rate = float(rate_per_sec)
+            if burst is not None:
+                self.burst = float(burst)
+            self._tokens = min(self._tokens, self.burst)
+
+    def acquire(self, n: float = 1.0) -> float:
+        """
+        Takes n tokens, sleeping as needed. Returns the time spent waiting.
+        """
+        waited = 0.0
+        remaining = float(n)
+        while True:
+            with self._lock:
+                self._refill()
+                needed = min(remaining, self.burst)
+                if self._tokens >= needed:
+                    self._tokens -= needed
+                    remaining -= needed
+                    if remaining <= 0:
+                        return waited
+                    continue
+                delay = (needed - self._tokens) / self.rate if self.rate > 0 else 0.1
+            time.sleep(delay)
+            waited += delay
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease of one rate.
+
+    - on_success(): at most once per increase_interval_sec, and only if the
+      budget actually made a caller wait since the last step (otherwise the
+      rate isn't the bottleneck and raising it proves nothing), the rate grows
+      by increase_step up to max_rate (None = unbounded).
+    - on_congestion(): the rate is multiplied by decrease_factor (down to
+      min_rate), at most once per cooldown_sec so one throttled batch, or
+      several senders hitting the same throttle, count as one signal.
+
+    apply(rate) is called on every change; the rate is logged on every cut
+    and otherwise at most every log_interval_sec.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        unit: str,
+        initial_rate: float,
+        min_rate: float,
+        max_rate: Optional[float],
+        increase_step: float,
+        apply: Callable[[float], None],
+        decrease_factor: float = 0.7,
+        increase_interval_sec: float = 1.0,
+        cooldown_sec: float = 1.0,
+        log_interval_sec: float = 10.0,
+    ):
+        self.name = name
+        self.unit = unit
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.increase_interval_sec = increase_interval_sec
+        self.cooldown_sec = cooldown_sec
+        self.log_interval_sec = log_interval_sec
+        self._apply = apply
+
+        self._lock = threading.Lock()
+        self.rate = self._clamp(initial_rate)
+        self.increases = 0
+        self.decreases = 0
+        self._limited = False
+        now = time.monotonic()
+        self._last_increase = now
+        self._last_decrease = 0.0
+        self._last_log = now
+        self._apply(self.rate)
+
+    def _clamp(self, rate: float) -> float:
+        rate = max(self.min_rate, rate)
+        return min(self.max_rate, rate) if self.max_rate is not None else rate
+
+    def note_wait(self, waited: float):
+        if waited > 0:
+            self._limited = True
+
+    def on_success(self):
+        now = time.monotonic()
+        if self._limited and now - self._last_increase >= self.increase_interval_sec:
+            with self._lock:
+                if self._limited and now - self._last_increase >= self.increase_interval_sec:
+                    self._limited = False
+                    self._last_increase = now
+                    rate = self._clamp(self.rate + self.increase_step)
+                    if rate != self.rate:
+                        self.rate = rate
+                        self.increases += 1
+                        self._apply(rate)
+
+        if now - self._last_log >= self.log_interval_sec:
+            self._last_log = now
+            logger.info(
+                "%s rate %.1f %s (%s increase(s), %s decrease(s))",
+                self.name, self.rate, self.unit, self.increases, self.decreases,
+            )
+
+    def on_congestion(self, reason: str):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_decrease < self.cooldown_sec:
+                return
+            self._last_decrease = now
+            # no growth right after a cut: wait a full interval of clean sends
+            self._last_increase = now
+            self._limited = False
+            rate = self._clamp(self.rate * self.decrease_factor)
+            self.decreases += 1
+            if rate != self.rate:
+                self.rate = rate
+                self._apply(rate)
+        self._last_log = now
+        logger.warning("%s rate cut to %.1f %s (%s)", self.name, rate, self.unit, reason)
+
+    def stats(self):
+        return {
+            "rate": round(self.rate, 1),
+            "unit": self.unit,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class StreamRateLimiter:
+    """
+    Records/s and bytes/s budgets for one Kinesis stream. When adaptive, an
+    AIMD controller drives the records/s rate and bytes/s follows in the
+    same proportion as the shard limits.
+    """
+
+    def __init__(self, records_per_sec: float, bytes_per_sec: float):
+        self.records = TokenBucket(records_per_sec)
+        self.bytes = TokenBucket(bytes_per_sec)
+        self.control: Optional[AimdController] = None
+
+    @classmethod
+    def for_shards(cls, shard_count: int, utilization: float = 0.9) -> "StreamRateLimiter":
+        """
+        Sized to a fraction of the stream's write capacity (headroom for other writers).
+        """
+        return cls(
+            shard_count * SHARD_RECORDS_PER_SEC * utilization,
+            shard_count * SHARD_BYTES_PER_SEC * utilization,
+        )
+
+    @classmethod
+    def adaptive(cls, shard_count: Optional[int], utilization: float = 0.9) -> "StreamRateLimiter":
+        """
+        With a known shard count the rate starts at half the stream's capacity
+        and never goes above utilization of it. Without one it starts at one
+        shard's worth and is bounded only by throttling.
+        """
+        if shard_count:
+            max_rate = shard_count * SHARD_RECORDS_PER_SEC * utilization
+            initial, step = max_rate / 2, max_rate / 20
+        else:
+            max_rate = None
+            initial, step = SHARD_RECORDS_PER_SEC * utilization, SHARD_RECORDS_PER_SEC / 10
+        limiter = cls(initial, initial * SHARD_BYTES_PER_SEC / SHARD_RECORDS_PER_SEC)
+        limiter.control = AimdController(
+            "Stream",
+            "records/s",
+            initial_rate=initial,
+            min_rate=SHARD_RECORDS_PER_SEC / 20,
+            max_rate=max_rate,
+            increase_step=step,
+            apply=limiter.set_records_rate,
+        )
+        return limiter
+
+    def set_records_rate(self, records_per_sec: float):
+        # one second of burst, so a cut takes effect right away
+        self.records.set_rate(records_per_sec, burst=records_per_sec)
+        bytes_per_sec = records_per_sec * SHARD_BYTES_PER_SEC / SHARD_RECORDS_PER_SEC
+        self.bytes.set_rate(bytes_per_sec, burst=bytes_per_sec)
+
+    def request_limits(self) -> Tuple[int, int]:
+        """
+        (records, bytes) one PutRecords call may carry: the current burst of
+        each budget. A larger call would reach the shards as a single burst
+        over the rate, and be throttled however low the rate is set.
+        """
+        return max(1, int(self.records.burst)), max(1, int(self.bytes.burst))
+
+    def acquire(self, records: int, nbytes: int) -> float:
+        waited = self.records.acquire(records) + self.bytes.acquire(nbytes)
+        if self.control is not None:
+            self.control.note_wait(waited)
+        return waited
+
+    def on_success(self):
+        if self.control is not None:
+            self.control.on_success()
+
+    def on_congestion(self, reason: str):
+        if self.control is not None:
+            self.control.on_congestion(reason)
+
+    def stats(self):
+        if self.control is not None:
+            return self.control.stats()
+        return {"rate": round(self.records.rate, 1), "unit": "records/s"}
+
+
+class ApiRateLimiter:
+    """
+    Requests/s budget for the source API, driven by AIMD: 429s, 5xx and
+    timeouts cut it, successful pages grow it (up to max_rps).
+    """
+
+    def __init__(self, initial_rps: float, max_rps: float, min_rps: float = 0.5, adaptive: bool = True):
+        self.bucket = TokenBucket(initial_rps if adaptive else max_rps, burst=1)
+        self.control: Optional[AimdController] = None
+        if adaptive:
+            self.control = AimdController(
+                "API",
+                "requests/s",
+                initial_rate=initial_rps,
+                min_rate=min_rps,
+                max_rate=max_rps,
+                increase_step=max(0.5, max_rps / 20),
+                apply=self.bucket.set_rate,
+                decrease_factor=0.5,
+            )
+
+    def acquire(self) -> float:
+        waited = self.bucket.acquire(1)
+        if self.control is not None:
+            self.control.note_wait(waited)
+        return waited
+
+    def on_success(self):
+        if self.control is not None:
+            self.control.on_success()
+
+    def on_error(self, reason: str):
+        if self.control is not None:
+            self.control.on_congestion(reason)
+
+    def stats(self):
+        if self.control is not None:
+            return self.control.stats()
+        return {"rate": round(self.bucket.rate, 1), "unit": "requests/s"}
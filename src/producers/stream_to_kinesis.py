@@ -6,53 +6,167 @@ Streams paginated records from your FastAPI endpoint to Kinesis Data Streams.
 API response format (confirmed):
 {
   "data": [ {...}, {...}, ... ],
-  "next_offset": 100
+  "next_offset": 100,
+  "next_cursor": "eyJ2Ijo...",
+  "total": 1234
 }
 
 Example request:
   /fetch_data?year=2008&country=Sri%20Lanka&offset=0&limit=100
+  /fetch_data?year=2008&country=Sri%20Lanka&cursor=eyJ2Ijo...&limit=100
 """
 
 import argparse
 import json
 import logging
 import os
+import queue
+import random
+import threading
 import time
-from typing import Any, Dict, List, Optional
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 import boto3
 import requests
+from botocore.exceptions import BotoCoreError, ClientError
+
+from src.producers.checkpoint import CheckpointStore
+from src.producers.fanout import parse_countries, parse_years, run_fanout
+from src.producers.http_client import API_MAX_ATTEMPTS, DEFAULT_TIMEOUT_SEC, AsyncPageFetcher, configure_session, get_json, get_session
+from src.producers.partitioning import (
+    KEY_STATS,
+    STRATEGIES,
+    FieldPartitioner,
+    PartitionStrategy,
+    build_partitioner,
+    list_open_shards,
+)
+from src.producers.rate_limit import ApiRateLimiter, StreamRateLimiter
+from src.producers.telemetry import METRICS_FORMATS, TIMINGS, MetricsWriter
 
 logger = logging.getLogger("api_to_kds")
 
+# PutRecords limits (partition key bytes count towards both size limits)
+MAX_RECORDS_PER_PUT = 500
+MAX_BYTES_PER_PUT = 5 * 1024 * 1024
+MAX_BYTES_PER_RECORD = 1024 * 1024
+DEFAULT_AGGREGATE_MAX_BYTES = 256 * 1024
+
+# PutRecords error codes (per record or for the whole call) worth retrying
+THROTTLE_ERROR_CODES = {"ProvisionedThroughputExceededException", "ThrottlingException", "LimitExceededException"}
+RETRYABLE_ERROR_CODES = THROTTLE_ERROR_CODES | {"InternalFailure", "ServiceUnavailable", "KMSThrottlingException"}
+
+
+class RetryPolicy:
+    """
+    Retry settings for PutRecords: exponential backoff with full jitter,
+    bounded by max_attempts and by a total time budget per batch.
+    Records that still fail go to dead_letter_path (JSON lines) if set,
+    otherwise the batch raises.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 8,
+        base_delay_sec: float = 0.1,
+        max_delay_sec: float = 5.0,
+        time_budget_sec: float = 120.0,
+        dead_letter_path: Optional[str] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay_sec = base_delay_sec
+        self.max_delay_sec = max_delay_sec
+        self.time_budget_sec = time_budget_sec
+        self.dead_letter_path = dead_letter_path
+
+    def backoff(self, attempt: int) -> float:
+        # "full jitter": uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.max_delay_sec, self.base_delay_sec * (2 ** attempt)))
+
+
+class ProducerMetrics:
+    """
+    Thread-safe counters for the Kinesis side of a run (used to size shards).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.put_calls = 0
+        self.records_sent = 0
+        self.rows_sent = 0
+        self.records_retried = 0
+        self.throttled = 0
+        self.call_errors = 0
+        self.final_failures = 0
+
+    def add(self, **counts: int):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "put_calls": self.put_calls,
+                "records_sent": self.records_sent,
+                "rows_sent": self.rows_sent,
+                "records_retried": self.records_retried,
+                "throttled": self.throttled,
+                "call_errors": self.call_errors,
+                "final_failures": self.final_failures,
+            }
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+METRICS = ProducerMetrics()
+_dead_letter_lock = threading.Lock()
+
 
 def build_kinesis_client(region: str):
     # Uses AWS default credential chain (AWS profile, env vars, IAM role, etc.)
     return boto3.client("kinesis", region_name=region, verify=False)
 
+def page_params(
+    year: Optional[int],
+    country: Optional[str],
+    offset: int,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    # unset filters are left out (requests drops None values, httpx would not)
+    params: Dict[str, Any] = {"offset": offset, "limit": limit}
+    if year is not None:
+        params["year"] = year
+    if country is not None:
+        params["country"] = country
+    if cursor:
+        params["cursor"] = cursor
+    return params
+
+
 def fetch_page(
     api_url: str,
     year: int,
     country: str,
     offset: int,
     limit: int,
+    cursor: Optional[str] = None,
+    api_limiter: Optional[ApiRateLimiter] = None,
 ) -> Dict[str, Any]:
     """
-    Calls the API once and returns parsed JSON.
-    Expected keys: 'data' (list), 'next_offset' (int, optional)
+    Calls the API once (over the shared pooled session) and returns parsed JSON.
+    429/5xx/timeouts are retried and fed back to api_limiter.
+    Expected keys: 'data' (list), 'next_offset' (int, optional), 'next_cursor' (str, optional)
     """
-    params = {
-        "year": year,
-        "country": country,
-        "offset": offset,
-        "limit": limit,
-    }
-
-    resp = requests.get(api_url, params=params, timeout=60)
-    resp.raise_for_status()
+    with TIMINGS.time("fetch_page"):
+        payload = get_json(api_url, page_params(year, country, offset, limit, cursor), api_limiter=api_limiter)
+    return validate_page(payload)
 
-    payload = resp.json()
 
+def validate_page(payload: Any) -> Dict[str, Any]:
     # Validate expected structure early (fail fast if API changes)
     if not isinstance(payload, dict) or "data" not in payload:
         raise ValueError(f"Unexpected API response structure. Got keys: {list(payload) if isinstance(payload, dict) else type(payload)}")
@@ -63,52 +177,338 @@ def fetch_page(
     return payload
 
 
-def put_records_batch(
+def sibling_url(api_url: str, endpoint: str) -> str:
+    """
+    https://.../fetch_data -> https://.../<endpoint>
+    """
+    return api_url.rstrip("/").rsplit("/", 1)[0] + "/" + endpoint
+
+
+def export_url_from_api_url(api_url: str) -> str:
+    return sibling_url(api_url, "export")
+
+
+def fetch_slices(
+    api_url: str,
+    years: Optional[List[int]] = None,
+    countries: Optional[List[str]] = None,
+    max_attempts: int = API_MAX_ATTEMPTS,
+) -> Dict[Tuple[int, str], int]:
+    """
+    Asks the API's /slices endpoint which (year, country) slices exist and how
+    many rows each has, optionally restricted to the given years/countries.
+    """
+    payload = get_json(sibling_url(api_url, "slices"), max_attempts=max_attempts)
+
+    if not isinstance(payload, dict) or not isinstance(payload.get("slices"), list):
+        raise ValueError(f"Unexpected /slices response structure: {type(payload)}")
+
+    slices = {}
+    for s in payload["slices"]:
+        if years and s["year"] not in years:
+            continue
+        if countries and s["country"] not in countries:
+            continue
+        slices[(int(s["year"]), str(s["country"]))] = int(s["rows"])
+    return slices
+
+
+def iter_export_rows(
+    export_url: str,
+    year: int,
+    country: str,
+    gzip: bool = True,
+    offset: int = 0,
+):
+    """
+    Calls the /export endpoint once and yields rows as the NDJSON lines arrive.
+    gzip=False asks the server for an uncompressed stream.
+    offset skips that many filtered rows (used to resume).
+    """
+    params = {
+        "year": year,
+        "country": country,
+        "offset": offset,
+    }
+    headers = None if gzip else {"Accept-Encoding": "identity"}
+
+    with get_session().get(export_url, params=params, headers=headers, stream=True, timeout=DEFAULT_TIMEOUT_SEC) as resp:
+        resp.raise_for_status()
+        logger.info("Export started. Server reports %s row(s)", resp.headers.get("X-Total-Count"))
+
+        # requests transparently decodes the Content-Encoding
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError(f"Unexpected export line. Expected JSON object, got {type(row)}")
+            yield row
+
+
+def write_dead_letters(path: str, stream_name: str, entries: List[Dict[str, Any]]):
+    """
+    Appends records that could not be delivered to a local JSON-lines file,
+    so they can be inspected and replayed later.
+    """
+    with _dead_letter_lock, open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps({"stream": stream_name, "ts": time.time(), **entry}, ensure_ascii=False) + "\n")
+
+
+def put_records_with_retry(
     kinesis_client,
     stream_name: str,
+    records: List[Dict[str, Any]],
+    retry_policy: Optional[RetryPolicy] = None,
+    partitioner: Optional[PartitionStrategy] = None,
+    rate_limiter: Optional[StreamRateLimiter] = None,
+) -> int:
+    """
+    Sends one PutRecords batch and resubmits only the entries that failed
+    (per the response's Records array) until they succeed or the policy gives
+    up. Returns the number of rows delivered (an aggregated record carries
+    several rows).
+    """
+    policy = retry_policy or DEFAULT_RETRY_POLICY
+    deadline = time.monotonic() + policy.time_budget_sec
+
+    pending = records
+    last_errors: List[Dict[str, Any]] = [{} for _ in pending]
+    delivered = 0
+    attempt = 0
+
+    while True:
+        oversized = False
+        if rate_limiter is not None:
+            nbytes = sum(record_size(r) for r in pending)
+            max_records, max_bytes = rate_limiter.request_limits()
+            # a call over the budget's burst (a retry after a cut, one huge
+            # record) lands on the shards as a burst of its own; throttling it
+            # says nothing about the rate, so it must not cut it
+            oversized = len(pending) > max_records or nbytes > max_bytes
+            rate_limiter.acquire(len(pending), nbytes)
+        METRICS.add(put_calls=1)
+        try:
+            with TIMINGS.time("put_records"):
+                resp = kinesis_client.put_records(StreamName=stream_name, Records=pending)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code not in RETRYABLE_ERROR_CODES:
+                raise
+            METRICS.add(call_errors=1, throttled=1 if code in THROTTLE_ERROR_CODES else 0)
+            last_errors = [{"ErrorCode": code, "ErrorMessage": str(e)} for _ in pending]
+            if rate_limiter is not None and not oversized:
+                rate_limiter.on_congestion(code)
+        except BotoCoreError as e:
+            # connection resets, read timeouts, ...
+            METRICS.add(call_errors=1)
+            if rate_limiter is not None:
+                rate_limiter.on_congestion(type(e).__name__)
+            last_errors = [{"ErrorCode": type(e).__name__, "ErrorMessage": str(e)} for _ in pending]
+        else:
+            retry: List[Dict[str, Any]] = []
+            retry_errors: List[Dict[str, Any]] = []
+            throttled = 0
+            rows_ok = 0
+            for record, result in zip(pending, resp.get("Records", [])):
+                code = result.get("ErrorCode")
+                if not code:
+                    rows_ok += rows_in(record)
+                    size = record_size(record)
+                    KEY_STATS.record_sent(record["PartitionKey"], result.get("ShardId"), size)
+                    if partitioner is not None and result.get("ShardId"):
+                        partitioner.record_load(result["ShardId"], size)
+                    continue
+                if code in THROTTLE_ERROR_CODES:
+                    throttled += 1
+                    KEY_STATS.record_throttled(record["PartitionKey"])
+                retry.append(record)
+                retry_errors.append({"ErrorCode": code, "ErrorMessage": result.get("ErrorMessage")})
+
+            delivered += rows_ok
+            METRICS.add(records_sent=len(pending) - len(retry), rows_sent=rows_ok, throttled=throttled)
+            KEY_STATS.maybe_log()
+            if rate_limiter is not None:
+                if not retry:
+                    rate_limiter.on_success()
+                elif not oversized:
+                    rate_limiter.on_congestion(f"{throttled} throttled / {len(retry)} failed record(s)")
+            if not retry:
+                return delivered
+            pending, last_errors = retry, retry_errors
+
+        attempt += 1
+        delay = policy.backoff(attempt)
+        if attempt >= policy.max_attempts or time.monotonic() + delay > deadline:
+            break
+
+        logger.warning(
+            "PutRecords: %s record(s) failed (%s); retry %s/%s in %.2fs",
+            len(pending), last_errors[0].get("ErrorCode"), attempt, policy.max_attempts - 1, delay,
+        )
+        METRICS.add(records_retried=len(pending))
+        time.sleep(delay)
+
+    METRICS.add(final_failures=len(pending))
+    if not policy.dead_letter_path:
+        raise RuntimeError(
+            f"PutRecords failed for {len(pending)} record(s) after {attempt} attempt(s). Last error: {last_errors[0]}"
+        )
+
+    logger.error("PutRecords: dead-lettering %s record(s) to %s", len(pending), policy.dead_letter_path)
+    write_dead_letters(
+        policy.dead_letter_path,
+        stream_name,
+        [
+            {"PartitionKey": r["PartitionKey"], "Data": r["Data"].decode("utf-8"), "rows": rows_in(r), **err}
+            for r, err in zip(pending, last_errors)
+        ],
+    )
+    return delivered
+
+
+def rows_in(record: Dict[str, Any]) -> int:
+    # JSON never contains a raw newline, so each line of Data is one row
+    return record["Data"].count(b"\n") + 1
+
+
+def record_size(record: Dict[str, Any]) -> int:
+    return len(record["Data"]) + len(record["PartitionKey"].encode("utf-8"))
+
+
+def build_records(
     items: List[Dict[str, Any]],
-    partition_key_field: Optional[str] = None,
-    default_partition_key: str = "1",
-):
+    partitioner: PartitionStrategy,
+    aggregate: bool = False,
+    aggregate_max_bytes: int = DEFAULT_AGGREGATE_MAX_BYTES,
+) -> List[Dict[str, Any]]:
     """
-    Sends up to 500 records per request using PutRecords.
-    If partition_key_field is provided and exists in the record, uses it.
-    Otherwise uses default_partition_key.
+    Turns rows into PutRecords entries (Data as UTF-8 JSON bytes), keyed by
+    the partitioner (PartitionKey and, for explicit-hash, ExplicitHashKey).
 
-    NOTE: Using a more varied partition key is better for shard distribution.
+    With aggregate=True, consecutive rows sharing a partition key are packed
+    into one newline-delimited record of at most aggregate_max_bytes; the
+    Firehose transform splits them again. Order within a key is preserved.
     """
-    if not items:
-        return
+    aggregate_max_bytes = min(aggregate_max_bytes, MAX_BYTES_PER_RECORD)
+
+    records: List[Dict[str, Any]] = []
+    open_records: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}  # key -> record still accepting rows
 
-    records = []
     for item in items:
         if not isinstance(item, dict):
             # Skip or raise; choose raise to avoid corrupting stream
             raise ValueError(f"Expected each record in 'data' to be a dict, got {type(item)}")
 
-        if partition_key_field and partition_key_field in item and item[partition_key_field] not in (None, ""):
-            pk = str(item[partition_key_field])
-        else:
-            pk = default_partition_key
+        pk, explicit_hash_key = partitioner.assign(item)
+        data = json.dumps(item, ensure_ascii=False).encode("utf-8")
+
+        if len(data) + len(pk.encode("utf-8")) > MAX_BYTES_PER_RECORD:
+            raise ValueError(f"Row with partition key {pk!r} is {len(data)} bytes, over the 1 MiB Kinesis record limit")
+
+        if aggregate:
+            current = open_records.get((pk, explicit_hash_key))
+            if current is not None and record_size(current) + 1 + len(data) <= aggregate_max_bytes:
+                current["Data"] += b"\n" + data
+                continue
+
+        record = {"Data": data, "PartitionKey": pk}
+        if explicit_hash_key is not None:
+            record["ExplicitHashKey"] = explicit_hash_key
+        records.append(record)
+        if aggregate:
+            open_records[(pk, explicit_hash_key)] = record
+
+    return records
+
+
+def batch_by_bytes(records: List[Dict[str, Any]], rate_limiter: Optional[StreamRateLimiter] = None):
+    """
+    Groups records into PutRecords requests that respect both the 500-record
+    and the 5 MiB per-request limits and, with a rate limiter, its current
+    burst (StreamRateLimiter.request_limits).
+    """
+    max_records, max_bytes = MAX_RECORDS_PER_PUT, MAX_BYTES_PER_PUT
+    if rate_limiter is not None:
+        burst_records, burst_bytes = rate_limiter.request_limits()
+        max_records, max_bytes = min(max_records, burst_records), min(max_bytes, burst_bytes)
+
+    batch: List[Dict[str, Any]] = []
+    batch_bytes = 0
+    for record in records:
+        size = record_size(record)
+        if batch and (len(batch) >= max_records or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(record)
+        batch_bytes += size
+    if batch:
+        yield batch
 
-        records.append(
-            {
-                "Data": json.dumps(item, ensure_ascii=False),
-                "PartitionKey": pk,
-            }
-        )
 
-    resp = kinesis_client.put_records(StreamName=stream_name, Records=records)
+def put_records_batch(
+    kinesis_client,
+    stream_name: str,
+    items: List[Dict[str, Any]],
+    partition_key_field: Optional[str] = None,
+    default_partition_key: str = "1",
+    retry_policy: Optional[RetryPolicy] = None,
+    aggregate: bool = False,
+    aggregate_max_bytes: int = DEFAULT_AGGREGATE_MAX_BYTES,
+    partitioner: Optional[PartitionStrategy] = None,
+    rate_limiter: Optional[StreamRateLimiter] = None,
+) -> int:
+    """
+    Sends any number of rows, split into PutRecords requests by count and bytes.
+    If partition_key_field is provided and exists in the record, uses it.
+    Otherwise uses default_partition_key. A partitioner (see partitioning.py)
+    replaces both.
+
+    Failed entries are retried per retry_policy; returns the number of
+    rows delivered (dead-lettered rows are not counted).
+
+    NOTE: Using a more varied partition key is better for shard distribution.
+    """
+    if not items:
+        return 0
 
-    failed = resp.get("FailedRecordCount", 0)
-    if failed and failed > 0:
-        # In real pipelines you’d retry failed ones; for now fail loudly so you notice.
-        raise RuntimeError(f"PutRecords failed for {failed} record(s). Response: {resp}")
+    if partitioner is None:
+        partitioner = FieldPartitioner(partition_key_field, default_partition_key)
 
+    with TIMINGS.time("put_records_batch"):
+        records = build_records(items, partitioner, aggregate=aggregate, aggregate_max_bytes=aggregate_max_bytes)
 
-def chunked(items: List[Dict[str, Any]], size: int):
-    for i in range(0, len(items), size):
-        yield items[i : i + size]
+        delivered = 0
+        for batch in batch_by_bytes(records, rate_limiter):
+            delivered += put_records_with_retry(
+                kinesis_client, stream_name, batch,
+                retry_policy=retry_policy, partitioner=partitioner, rate_limiter=rate_limiter,
+            )
+    return delivered
+
+
+def resume_point(
+    checkpoint: Optional[CheckpointStore],
+    year: int,
+    country: str,
+    start_offset: int,
+) -> Tuple[Optional[int], int]:
+    """
+    Returns (offset to start from, records already sent) for a slice, or
+    (None, records_sent) if the checkpoint says the slice is complete.
+    """
+    cp = checkpoint.load(year, country) if checkpoint is not None else None
+    if cp is None:
+        return start_offset, 0
+    if cp["completed"]:
+        logger.info("Slice year=%s country=%s already completed (%s record(s)). Skipping.", year, country, cp["records_sent"])
+        return None, cp["records_sent"]
+    logger.info(
+        "Resuming slice year=%s country=%s from offset=%s (%s record(s) already sent)",
+        year, country, cp["next_offset"], cp["records_sent"],
+    )
+    return cp["next_offset"], cp["records_sent"]
 
 
 def stream_all_pages(
@@ -120,38 +520,62 @@ def stream_all_pages(
     start_offset: int,
     limit: int,
     sleep_between_pages_sec: float = 0.0,
+    use_cursor: bool = False,
+    send_options: Optional[Dict[str, Any]] = None,
+    checkpoint: Optional[CheckpointStore] = None,
+    api_limiter: Optional[ApiRateLimiter] = None,
 ):
     """
     Keeps calling the API using next_offset until no more data is returned.
+    With use_cursor=True the first page is fetched at start_offset and every
+    following page resumes from the API's next_cursor instead (constant cost per page).
+    With a checkpoint store, progress is saved after every acknowledged page
+    and a previous run of the same slice is resumed.
     """
-    offset = start_offset
+    offset, already_sent = resume_point(checkpoint, year, country, start_offset)
+    if offset is None:
+        return 0
+    cursor = None
     total_sent = 0
 
     while True:
-        logger.info("Fetching page offset=%s limit=%s year=%s country=%s", offset, limit, year, country)
+        logger.info("Fetching page offset=%s cursor=%s limit=%s year=%s country=%s", offset, cursor, limit, year, country)
 
-        payload = fetch_page(api_url, year=year, country=country, offset=offset, limit=limit)
+        payload = fetch_page(api_url, year=year, country=country, offset=offset, limit=limit, cursor=cursor, api_limiter=api_limiter)
         rows = payload.get("data", [])
         next_offset = payload.get("next_offset", None)
+        next_cursor = payload.get("next_cursor", None)
 
         if not rows:
             logger.info("No rows returned. Stopping.")
+            if checkpoint is not None:
+                checkpoint.save(year, country, offset, already_sent + total_sent, completed=True)
             break
 
-        # Send records to Kinesis (in Kinesis max batch size 500)
-        for batch in chunked(rows, 500):
-            # Partition key suggestion:
-            # - better: "mkt_name" (or "country" + "mkt_name") to spread load
-            put_records_batch(
-                kinesis_client,
-                stream_name=stream_name,
-                items=batch,
-                partition_key_field="mkt_name",   # you have this field
-                default_partition_key=country,    # fallback spreads by country at least
-            )
+        # Send records to Kinesis (put_records_batch splits into PutRecords-sized requests)
+        # Partition key suggestion:
+        # - better: "mkt_name" (or "country" + "mkt_name") to spread load
+        sent = put_records_batch(
+            kinesis_client,
+            stream_name=stream_name,
+            items=rows,
+            partition_key_field="mkt_name",   # you have this field
+            default_partition_key=country,    # fallback spreads by country at least
+            **(send_options or {}),
+        )
+
+        total_sent += sent
+        logger.info("Sent %s record(s) this page. Total sent=%s", sent, total_sent)
 
-        total_sent += len(rows)
-        logger.info("Sent %s record(s) this page. Total sent=%s", len(rows), total_sent)
+        if checkpoint is not None:
+            # the page is fully acknowledged by Kinesis: safe to resume after it
+            checkpoint.save(
+                year, country,
+                next_offset=int(next_offset) if next_offset is not None else offset + len(rows),
+                records_sent=already_sent + total_sent,
+                next_cursor=next_cursor,
+                completed=next_offset is None,
+            )
 
         if next_offset is None:
             logger.info("No next_offset in response. Stopping.")
@@ -159,6 +583,10 @@ def stream_all_pages(
 
         # Advance pagination
         offset = int(next_offset)
+        if use_cursor:
+            if not next_cursor:
+                raise ValueError("API did not return next_cursor; it may not support cursor pagination")
+            cursor = next_cursor
 
         if sleep_between_pages_sec > 0:
             time.sleep(sleep_between_pages_sec)
@@ -166,34 +594,477 @@ def stream_all_pages(
     return total_sent
 
 
+def stream_all_pages_pipelined(
+    api_url: str,
+    kinesis_client,
+    stream_name: str,
+    year: int,
+    country: str,
+    start_offset: int,
+    limit: int,
+    use_cursor: bool = False,
+    fetch_workers: int = 4,
+    send_workers: int = 4,
+    prefetch_depth: int = 8,
+    send_options: Optional[Dict[str, Any]] = None,
+    checkpoint: Optional[CheckpointStore] = None,
+    async_fetcher: Optional[AsyncPageFetcher] = None,
+    api_limiter: Optional[ApiRateLimiter] = None,
+):
+    """
+    Pipelined variant of stream_all_pages: API fetches and Kinesis sends overlap.
+
+    - Up to prefetch_depth pages are requested ahead by fetch_workers threads
+      (offset mode only; cursor mode has to fetch serially but still overlaps
+      with sending).
+    - Pages are consumed in order and each row is routed to a sender thread by
+      a stable hash of its partition key, so records keep their order within a
+      partition key.
+    - Sender queues are bounded: a slow Kinesis stage blocks dispatch, which
+      stops new fetches from being scheduled (backpressure).
+    - Pages are acknowledged out of order across senders, so the checkpoint
+      only advances over the contiguous prefix of fully acknowledged pages.
+    - With async_fetcher, page requests go through its single httpx event
+      loop instead of fetch_workers threads.
+    """
+    start_offset, already_sent = resume_point(checkpoint, year, country, start_offset)
+    if start_offset is None:
+        return 0
+
+    partition_key_field = "mkt_name"
+    default_partition_key = country
+    router = (send_options or {}).get("partitioner") or FieldPartitioner(partition_key_field, default_partition_key)
+
+    started = time.monotonic()
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    sender_queues: List[queue.Queue] = [queue.Queue(maxsize=prefetch_depth) for _ in range(send_workers)]
+    sent_per_sender = [0] * send_workers
+
+    # acknowledgement tracking for the checkpoint
+    ack_lock = threading.Lock()
+    page_parts: Dict[int, int] = {}  # page_no -> sender groups not yet acknowledged
+    page_sent: Dict[int, int] = {}  # page_no -> rows delivered so far
+    page_resume: Dict[int, Tuple[int, Optional[str], bool]] = {}  # page_no -> (next_offset, next_cursor, last)
+    next_unacked = 0
+    acked_sent = already_sent
+
+    def ack(page_no: int, sent: int):
+        nonlocal next_unacked, acked_sent
+        with ack_lock:
+            page_parts[page_no] -= 1
+            page_sent[page_no] += sent
+            while page_parts.get(next_unacked) == 0:
+                del page_parts[next_unacked]
+                acked_sent += page_sent.pop(next_unacked)
+                resume_offset, resume_cursor, last = page_resume.pop(next_unacked)
+                next_unacked += 1
+                if checkpoint is not None:
+                    checkpoint.save(year, country, resume_offset, acked_sent, next_cursor=resume_cursor, completed=last)
+
+    def sender(idx: int):
+        q = sender_queues[idx]
+        while True:
+            work = q.get()
+            if work is None:
+                return
+            if stop.is_set():
+                # keep draining so the dispatcher never blocks on a dead sender
+                continue
+            page_no, items = work
+            try:
+                sent = put_records_batch(
+                    kinesis_client,
+                    stream_name=stream_name,
+                    items=items,
+                    partition_key_field=partition_key_field,
+                    default_partition_key=default_partition_key,
+                    **(send_options or {}),
+                )
+                sent_per_sender[idx] += sent
+                ack(page_no, sent)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+
+    senders = [
+        threading.Thread(target=sender, args=(i,), name=f"kinesis-sender-{i}", daemon=True)
+        for i in range(send_workers)
+    ]
+    for t in senders:
+        t.start()
+
+    fetch_pool = ThreadPoolExecutor(max_workers=1 if use_cursor else fetch_workers, thread_name_prefix="api-fetch")
+    window: deque = deque()  # in-flight page fetches, in page order
+
+    def submit(offset: int, cursor: Optional[str] = None):
+        if async_fetcher is not None:
+            fut = async_fetcher.submit(api_url, page_params(year, country, offset, limit, cursor))
+        else:
+            fut = fetch_pool.submit(
+                fetch_page, api_url, year=year, country=country, offset=offset, limit=limit, cursor=cursor, api_limiter=api_limiter
+            )
+        window.append((offset, fut))
+
+    pages = 0
+    dispatched = 0
+    next_to_submit = start_offset
+    end_offset: Optional[int] = None  # set once the end of the slice is seen
+    try:
+        if use_cursor:
+            submit(start_offset)
+        else:
+            for _ in range(max(1, prefetch_depth)):
+                submit(next_to_submit)
+                next_to_submit += limit
+
+        while window and not stop.is_set():
+            offset, fut = window.popleft()
+            payload = validate_page(fut.result())
+            rows = payload.get("data", [])
+            next_offset = payload.get("next_offset", None)
+
+            if not rows:
+                logger.info("No rows returned at offset=%s. Stopping.", offset)
+                end_offset = offset
+                break
+
+            groups: List[List[Dict[str, Any]]] = [[] for _ in range(send_workers)]
+            for row in rows:
+                if not isinstance(row, dict):
+                    raise ValueError(f"Expected each record in 'data' to be a dict, got {type(row)}")
+                key = router.routing_key(row)
+                groups[zlib.crc32(key.encode("utf-8")) % send_workers].append(row)
+
+            with ack_lock:
+                page_parts[pages] = sum(1 for g in groups if g)
+                page_sent[pages] = 0
+                page_resume[pages] = (
+                    int(next_offset) if next_offset is not None else offset + len(rows),
+                    payload.get("next_cursor", None),
+                    next_offset is None,
+                )
+
+            for idx, group in enumerate(groups):
+                if group:
+                    sender_queues[idx].put((pages, group))  # blocks while that sender is behind
+
+            pages += 1
+            dispatched += len(rows)
+            logger.info("Dispatched page offset=%s rows=%s. Total dispatched=%s", offset, len(rows), dispatched)
+
+            if next_offset is None:
+                logger.info("No next_offset in response. Stopping.")
+                end_offset = offset + len(rows)
+                break
+
+            if use_cursor:
+                next_cursor = payload.get("next_cursor", None)
+                if not next_cursor:
+                    raise ValueError("API did not return next_cursor; it may not support cursor pagination")
+                submit(int(next_offset), cursor=next_cursor)
+            else:
+                if int(next_offset) != offset + limit:
+                    raise ValueError(f"Unexpected next_offset={next_offset} for offset={offset} limit={limit}; cannot prefetch")
+                submit(next_to_submit)
+                next_to_submit += limit
+    finally:
+        for _, fut in window:
+            fut.cancel()
+        fetch_pool.shutdown(wait=True)
+        for q in sender_queues:
+            q.put(None)
+        for t in senders:
+            t.join()
+
+    if errors:
+        raise errors[0]
+
+    if checkpoint is not None and end_offset is not None and pages == next_unacked:
+        checkpoint.save(year, country, end_offset, acked_sent, completed=True)
+
+    total_sent = sum(sent_per_sender)
+    elapsed = time.monotonic() - started
+    logger.info(
+        "Pipeline finished: pages=%s records=%s elapsed=%.1fs throughput=%.1f records/s",
+        pages, total_sent, elapsed, total_sent / elapsed if elapsed > 0 else 0.0,
+    )
+    return total_sent
+
+
+def stream_export(
+    export_url: str,
+    kinesis_client,
+    stream_name: str,
+    year: int,
+    country: str,
+    batch_size: int = 500,
+    gzip: bool = True,
+    send_options: Optional[Dict[str, Any]] = None,
+    checkpoint: Optional[CheckpointStore] = None,
+    start_offset: int = 0,
+):
+    """
+    Consumes the /export NDJSON stream line by line and sends a Kinesis batch
+    every batch_size rows, so sending overlaps with the download.
+    With a checkpoint store, the row offset is saved after every acknowledged
+    batch and a restarted export resumes from it; start_offset only applies
+    when there is no checkpoint for the slice.
+    """
+    offset, already_sent = resume_point(checkpoint, year, country, start_offset)
+    if offset is None:
+        return 0
+
+    total_sent = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        nonlocal total_sent, offset
+        sent = put_records_batch(
+            kinesis_client,
+            stream_name=stream_name,
+            items=batch,
+            partition_key_field="mkt_name",
+            default_partition_key=country,
+            **(send_options or {}),
+        )
+        total_sent += sent
+        offset += len(batch)
+        logger.info("Sent %s record(s). Total sent=%s", sent, total_sent)
+        batch.clear()
+        if checkpoint is not None:
+            checkpoint.save(year, country, offset, already_sent + total_sent)
+
+    for row in iter_export_rows(export_url, year=year, country=country, gzip=gzip, offset=offset):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    if checkpoint is not None:
+        checkpoint.save(year, country, offset, already_sent + total_sent, completed=True)
+
+    return total_sent
+
+
 def main():
     parser = argparse.ArgumentParser(description="Stream FastAPI paginated data to Kinesis Data Streams")
     parser.add_argument("--api-url", required=True, help="Full API URL, e.g. https://.../fetch_data")
     parser.add_argument("--stream-name", default="kds_global_food_stream", help="Kinesis Data Stream name")
     parser.add_argument("--region", default=os.getenv("AWS_REGION", "us-east-2"), help="AWS region (App Runner region, us-east-2 in this case)")
-    parser.add_argument("--year", type=int, required=True, help="Year filter, e.g. 2008")
-    parser.add_argument("--country", required=True, help="Country filter, e.g. 'Sri Lanka'")
-    parser.add_argument("--start-offset", type=int, default=0, help="Starting offset (default 0)")
+    parser.add_argument("--year", type=int, help="Year filter, e.g. 2008")
+    parser.add_argument("--country", help="Country filter, e.g. 'Sri Lanka'")
+    parser.add_argument("--years", default=None, help="Fan-out: year range/list, e.g. 2008-2012 or 2008,2010")
+    parser.add_argument("--countries", default=None, help="Fan-out: comma-separated country list")
+    parser.add_argument("--discover", action="store_true", help="Fan-out: discover (year, country) slices from the API's /slices endpoint")
+    parser.add_argument("--max-concurrent-slices", type=int, default=4, help="Fan-out: slices streamed at the same time")
+    parser.add_argument("--checkpoint-db", default="producer_checkpoint.db", help="SQLite file for resume checkpoints ('' to disable)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore and reset saved checkpoints for the selected slices")
+    parser.add_argument("--shard-count", type=int, default=None, help="Size the stream rate budget to this many shards (default: ListShards; 0 disables)")
+    parser.add_argument("--rate-control", choices=["adaptive", "fixed", "off"], default="adaptive", help="adaptive: AIMD on the API and stream budgets; fixed: static budgets; off: no pacing")
+    parser.add_argument("--api-initial-rps", type=float, default=5.0, help="Starting API request rate for --rate-control adaptive")
+    parser.add_argument("--api-max-rps", type=float, default=50.0, help="Upper bound on API requests/s")
+    parser.add_argument("--start-offset", type=int, default=0, help="Starting offset (default 0; a saved checkpoint for the slice takes precedence)")
     parser.add_argument("--limit", type=int, default=100, help="Page size (default 100)")
-    parser.add_argument("--sleep-between-pages-sec", type=float, default=0.0, help="Optional sleep between API page requests")
+    parser.add_argument("--sleep-between-pages-sec", type=float, default=0.0, help="Legacy fixed pause between API pages (prefer --rate-control)")
+    parser.add_argument("--use-cursor", action="store_true", help="Follow the API's next_cursor instead of next_offset")
+    parser.add_argument("--mode", choices=["pages", "export"], default="pages", help="pages: paginate /fetch_data; export: consume the /export NDJSON stream")
+    parser.add_argument("--export-url", default=None, help="Export endpoint URL (default: derived from --api-url)")
+    parser.add_argument("--max-put-attempts", type=int, default=8, help="PutRecords attempts per batch before dead-lettering")
+    parser.add_argument("--put-time-budget-sec", type=float, default=120.0, help="Max time spent retrying one PutRecords batch")
+    parser.add_argument("--dead-letter-file", default="kinesis_dead_letter.jsonl", help="Local JSON-lines file for records that still fail after retries ('' to fail the run instead)")
+    parser.add_argument("--aggregate", action="store_true", help="Pack several rows with the same partition key into one newline-delimited Kinesis record")
+    parser.add_argument("--aggregate-max-bytes", type=int, default=DEFAULT_AGGREGATE_MAX_BYTES, help="Max size of one aggregated record")
+    parser.add_argument("--partition-strategy", choices=STRATEGIES, default="field", help="How partition keys are chosen (see partitioning.py)")
+    parser.add_argument("--partition-key-field", default="mkt_name", help="Record field used by the field/salted/explicit-hash strategies")
+    parser.add_argument("--salt-buckets", type=int, default=4, help="Salt values per key for --partition-strategy salted")
+    parser.add_argument("--hot-key-share", type=float, default=0.2, help="Log a partition key as hot above this share of bytes sent")
+    parser.add_argument("--pipeline", action="store_true", help="Overlap API fetches and Kinesis sends (pages mode)")
+    parser.add_argument("--fetch-workers", type=int, default=4, help="Concurrent API fetches in --pipeline mode")
+    parser.add_argument("--send-workers", type=int, default=4, help="Concurrent Kinesis senders in --pipeline mode")
+    parser.add_argument("--prefetch-depth", type=int, default=8, help="Pages fetched ahead / queued per sender in --pipeline mode")
+    parser.add_argument("--http-client", choices=["sync", "async"], default="sync", help="--pipeline mode: fetch pages from a thread pool (sync) or one httpx event loop (async)")
+    parser.add_argument("--metrics-file", default=None, help="Append counters and fetch/put latencies to this file every --metrics-interval-sec ('-' for stdout)")
+    parser.add_argument("--metrics-format", choices=METRICS_FORMATS, default="json", help="json lines, or CloudWatch Embedded Metric Format (emf)")
+    parser.add_argument("--metrics-interval-sec", type=float, default=60.0, help="Seconds between --metrics-file lines")
     args = parser.parse_args()
 
+    fanout = bool(args.years or args.countries or args.discover)
+    if not fanout and (args.year is None or not args.country):
+        parser.error("--year and --country are required unless --years/--countries/--discover is used")
+    if fanout and not args.discover and not (args.years and args.countries):
+        parser.error("fan-out needs both --years and --countries, or --discover")
+
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
     kinesis_client = build_kinesis_client(args.region)
-
-    total = stream_all_pages(
-        api_url=args.api_url,
+    # one keep-alive connection per thread that can be calling the API at once
+    fetchers_per_slice = args.fetch_workers if args.pipeline else 1
+    configure_session(max(1, fetchers_per_slice * (args.max_concurrent_slices if fanout else 1)))
+    KEY_STATS.hot_share = args.hot_key_share
+    partitioner = build_partitioner(
+        args.partition_strategy,
+        field=args.partition_key_field,
+        default_key=args.country or "1",  # rows without mkt_name fall back to their country
+        salt_buckets=args.salt_buckets,
         kinesis_client=kinesis_client,
         stream_name=args.stream_name,
-        year=args.year,
-        country=args.country,
-        start_offset=args.start_offset,
-        limit=args.limit,
-        sleep_between_pages_sec=args.sleep_between_pages_sec,
     )
 
+    # forwarded to every put_records_batch call
+    send_options = {
+        "partitioner": partitioner,
+        "retry_policy": RetryPolicy(
+            max_attempts=args.max_put_attempts,
+            time_budget_sec=args.put_time_budget_sec,
+            dead_letter_path=args.dead_letter_file or None,
+        ),
+        "aggregate": args.aggregate,
+        "aggregate_max_bytes": args.aggregate_max_bytes,
+    }
+
+    # one stream budget and one API budget, shared by every slice and thread
+    api_limiter = None
+    if args.rate_control != "off":
+        shard_count = args.shard_count
+        if shard_count is None:
+            try:
+                shard_count = len(list_open_shards(kinesis_client, args.stream_name))
+            except (BotoCoreError, ClientError) as e:
+                logger.warning("ListShards failed (%s); stream budget not sized to shards", e)
+        if args.rate_control == "adaptive" and shard_count != 0:
+            send_options["rate_limiter"] = StreamRateLimiter.adaptive(shard_count)
+        elif args.rate_control == "fixed" and shard_count:
+            send_options["rate_limiter"] = StreamRateLimiter.for_shards(shard_count)
+        api_limiter = ApiRateLimiter(
+            initial_rps=args.api_initial_rps,
+            max_rps=args.api_max_rps,
+            adaptive=args.rate_control == "adaptive",
+        )
+        logger.info("Rate control %s: shards=%s", args.rate_control, shard_count)
+
+    async_fetcher = None
+    if args.pipeline and args.http_client == "async":
+        async_fetcher = AsyncPageFetcher(
+            max_connections=args.fetch_workers * (args.max_concurrent_slices if fanout else 1),
+            api_limiter=api_limiter,
+        )
+
+    checkpoint = CheckpointStore(args.checkpoint_db) if args.checkpoint_db else None
+
+    metrics_writer = None
+    if args.metrics_file:
+        metrics_writer = MetricsWriter(
+            args.metrics_file,
+            counters=METRICS.snapshot,
+            fmt=args.metrics_format,
+            interval_sec=args.metrics_interval_sec,
+            dimensions={"Stream": args.stream_name},
+        ).start()
+
+    def run_slice(year: int, country: str, start_offset: int = 0) -> int:
+        if checkpoint is not None and args.fresh:
+            checkpoint.reset(year, country)
+
+        if args.mode == "export":
+            return stream_export(
+                export_url=args.export_url or export_url_from_api_url(args.api_url),
+                kinesis_client=kinesis_client,
+                stream_name=args.stream_name,
+                year=year,
+                country=country,
+                send_options=send_options,
+                checkpoint=checkpoint,
+                start_offset=start_offset,
+            )
+        if args.pipeline:
+            return stream_all_pages_pipelined(
+                api_url=args.api_url,
+                kinesis_client=kinesis_client,
+                stream_name=args.stream_name,
+                year=year,
+                country=country,
+                start_offset=start_offset,
+                limit=args.limit,
+                use_cursor=args.use_cursor,
+                fetch_workers=args.fetch_workers,
+                send_workers=args.send_workers,
+                prefetch_depth=args.prefetch_depth,
+                send_options=send_options,
+                checkpoint=checkpoint,
+                async_fetcher=async_fetcher,
+                api_limiter=api_limiter,
+            )
+        return stream_all_pages(
+            api_url=args.api_url,
+            kinesis_client=kinesis_client,
+            stream_name=args.stream_name,
+            year=year,
+            country=country,
+            start_offset=start_offset,
+            limit=args.limit,
+            sleep_between_pages_sec=args.sleep_between_pages_sec,
+            use_cursor=args.use_cursor,
+            send_options=send_options,
+            checkpoint=checkpoint,
+            api_limiter=api_limiter,
+        )
+
+    if fanout:
+        years = parse_years(args.years) if args.years else None
+        countries = parse_countries(args.countries) if args.countries else None
+        # row counts per slice drive the fan-out ETA in both modes
+        if args.discover:
+            expected = fetch_slices(args.api_url, years=years, countries=countries)
+            slices = sorted(expected)
+        else:
+            slices = [(y, c) for y in years for c in countries]
+            try:
+                # only the ETA needs /slices here: one attempt, and no ETA without it
+                expected = fetch_slices(args.api_url, years=years, countries=countries, max_attempts=1)
+            except (requests.RequestException, ValueError) as e:
+                logger.warning("Could not fetch /slices for the ETA (%s); continuing without it", e)
+                expected = {}
+            expected = {s: expected[s] for s in slices if s in expected}
+
+        if checkpoint is not None and not args.fresh:
+            done = checkpoint.completed_slices()
+            if done & set(slices):
+                logger.info("Skipping %s slice(s) already completed per %s", len(done & set(slices)), args.checkpoint_db)
+            slices = [s for s in slices if s not in done]
+            expected = {s: n for s, n in expected.items() if s not in done}
+            # resumed slices only have their remaining rows left to send
+            for s in expected:
+                cp = checkpoint.load(*s)
+                if cp is not None:
+                    expected[s] = max(0, expected[s] - cp["next_offset"])
+
+        report = run_fanout(
+            slices,
+            run_slice,
+            rows_sent=lambda: METRICS.snapshot()["rows_sent"],
+            max_concurrent_slices=args.max_concurrent_slices,
+            expected_rows=expected,
+        )
+        logger.info("Fan-out report: %s", json.dumps(report, ensure_ascii=False))
+        total = report["rows_sent"]
+    else:
+        total = run_slice(args.year, args.country, start_offset=args.start_offset)
+
     logger.info("DONE. Total records streamed to KDS: %s", total)
+    logger.info("Kinesis metrics: %s", METRICS.snapshot())
+    logger.info("Latencies: %s", json.dumps(TIMINGS.snapshot()))
+    if api_limiter is not None:
+        logger.info("Final rates: api=%s stream=%s", api_limiter.stats(), send_options["rate_limiter"].stats() if "rate_limiter" in send_options else None)
+    logger.info("Partition key distribution: %s", json.dumps(KEY_STATS.report(), ensure_ascii=False))
+    if checkpoint is not None:
+        checkpoint.close()
+    if async_fetcher is not None:
+        async_fetcher.close()
+    if metrics_writer is not None:
+        metrics_writer.stop()
 
 
 if __name__ == "__main__":
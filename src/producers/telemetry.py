@@ -0,0 +1,193 @@
+"""
+telemetry.py
+
+Latency histograms for the producer's hot paths and an optional writer that
+reports them, with the ProducerMetrics counters, to a local file.
+
+Timed operations:
+  fetch_page          one API page, retries included (sync and async clients)
+  put_records_batch   one page's rows, split into PutRecords calls and retried
+  put_records         a single PutRecords call
+
+MetricsWriter appends one line per interval covering that interval only
+(counter deltas, latencies observed since the previous line), either as
+plain JSON or in CloudWatch Embedded Metric Format (EMF). EMF lines become
+CloudWatch metrics once the file is shipped to CloudWatch Logs (agent,
+Fluent Bit, or stdout on ECS/Lambda with "-" as the path).
+"""
+
+import bisect
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# milliseconds
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+EMF_NAMESPACE = "FoodMarket/Producer"
+METRICS_FORMATS = ("json", "emf")
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram; quantiles are reported as the upper bound of the
+    bucket they fall in (capped by the largest value seen).
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 2),
+            "p50_ms": round(self.quantile(0.50), 2),
+            "p99_ms": round(self.quantile(0.99), 2),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class Timings:
+    """
+    Thread-safe named histograms, kept both for the whole run (snapshot) and
+    for the current reporting interval (drain).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._total: Dict[str, LatencyHistogram] = {}
+        self._interval: Dict[str, LatencyHistogram] = {}
+
+    def observe(self, name: str, ms: float):
+        with self._lock:
+            for hists in (self._total, self._interval):
+                hist = hists.get(name)
+                if hist is None:
+                    hist = hists[name] = LatencyHistogram()
+                hist.observe(ms)
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self._total.items())}
+
+    def drain(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            interval, self._interval = self._interval, {}
+        return {name: h.summary() for name, h in sorted(interval.items())}
+
+
+TIMINGS = Timings()
+
+
+def emf_record(counters: Dict[str, int], timings: Dict[str, Dict[str, Any]], dimensions: Dict[str, str]) -> Dict[str, Any]:
+    """
+    One EMF log event: counters as Count metrics, each timing as
+    <name>_p50_ms / _p99_ms / _max_ms Milliseconds metrics.
+    """
+    record: Dict[str, Any] = dict(dimensions)
+    metrics: List[Dict[str, str]] = []
+    for name, value in counters.items():
+        record[name] = value
+        metrics.append({"Name": name, "Unit": "Count"})
+    for name, summary in timings.items():
+        if not summary.get("count"):
+            continue
+        for stat in ("p50_ms", "p99_ms", "max_ms"):
+            record[f"{name}_{stat}"] = summary[stat]
+            metrics.append({"Name": f"{name}_{stat}", "Unit": "Milliseconds"})
+    record["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [{"Namespace": EMF_NAMESPACE, "Dimensions": [sorted(dimensions)], "Metrics": metrics}],
+    }
+    return record
+
+
+class MetricsWriter:
+    """
+    Background thread appending one metrics line every interval_sec to path
+    ("-" for stdout), plus a final line on stop().
+    """
+
+    def __init__(
+        self,
+        path: str,
+        counters: Callable[[], Dict[str, int]],
+        fmt: str = "json",
+        interval_sec: float = 60.0,
+        dimensions: Optional[Dict[str, str]] = None,
+        timings: Timings = TIMINGS,
+    ):
+        if fmt not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format {fmt!r}; expected one of {METRICS_FORMATS}")
+        self.path = path
+        self.counters = counters
+        self.fmt = fmt
+        self.interval_sec = interval_sec
+        self.dimensions = dimensions or {}
+        self.timings = timings
+        self._previous: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+
+    def start(self) -> "MetricsWriter":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_sec):
+            self.write()
+
+    def write(self):
+        current = self.counters()
+        deltas = {name: value - self._previous.get(name, 0) for name, value in current.items()}
+        self._previous = current
+        timings = self.timings.drain()
+
+        if self.fmt == "emf":
+            record = emf_record(deltas, timings, self.dimensions)
+        else:
+            record = {"timestamp": time.time(), **self.dimensions, "counters": deltas, "timings": timings}
+
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        if self.path == "-":
+            sys.stdout.write(line)
+            sys.stdout.flush()
+        else:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)